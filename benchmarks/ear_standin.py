@@ -0,0 +1,217 @@
+"""
+Pure-Python stand-in for the subset of `edgin_around_rendering` used by the client.
+
+It keeps the same state the native scene and world expositor would (actor positions, renderers,
+animations, attachments, highlight, camera) in ordinary Python data structures, draws nothing and
+counts every call in `calls`. Call `install` before importing `src`, so that the client modules pick
+up the stand-in instead of the native module.
+"""
+
+import collections, functools, math, sys
+
+from typing import Any, Callable, Counter, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+# Number of calls of every function, keyed by `Class.method`.
+calls: Counter[str] = collections.Counter()
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def _counted(function: _F) -> _F:
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        return function(*args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+def install() -> None:
+    """Makes `import edgin_around_rendering` return this module."""
+
+    sys.modules["edgin_around_rendering"] = sys.modules[__name__]
+
+
+def reset_calls() -> None:
+    calls.clear()
+
+
+@_counted
+def init() -> None:
+    pass
+
+
+class Point:
+    def __init__(self, theta: float, phi: float) -> None:
+        self._theta = theta
+        self._phi = phi
+
+    def get_theta(self) -> float:
+        return self._theta
+
+    def get_phi(self) -> float:
+        return self._phi
+
+    def __repr__(self) -> str:
+        return f"Point({self._theta:.4f}, {self._phi:.4f})"
+
+
+class Actor:
+    def __init__(self, id: int, entity_name: str, position: Optional[Point]) -> None:
+        self.id = id
+        self.entity_name = entity_name
+        self.position = position
+
+
+class ElevationFunction:
+    def __init__(self, radius: float) -> None:
+        self.radius = radius
+        self.terrain: List[Tuple[str, float, float]] = list()
+
+    @_counted
+    def add_terrain(self, name: str, theta: float, phi: float) -> None:
+        self.terrain.append((name, theta, phi))
+
+
+class Scene:
+    def __init__(self) -> None:
+        self._hero_id: Optional[int] = None
+        self._elevation: Optional[ElevationFunction] = None
+        self._positions: Dict[int, Point] = dict()
+        self._entities: Dict[int, str] = dict()
+        self._hidden: Set[int] = set()
+
+    @_counted
+    def configure(self, hero_id: int, elevation: ElevationFunction) -> None:
+        self._hero_id = hero_id
+        self._elevation = elevation
+
+    @_counted
+    def get_hero_id(self) -> Optional[int]:
+        return self._hero_id
+
+    @_counted
+    def get_radius(self) -> float:
+        return self._elevation.radius if self._elevation is not None else 1.0
+
+    @_counted
+    def create_actors(self, actors: Iterable[Actor]) -> None:
+        for actor in actors:
+            self._entities[actor.id] = actor.entity_name
+            if actor.position is not None:
+                self._positions[actor.id] = actor.position
+            else:
+                self._positions.pop(actor.id, None)
+
+    @_counted
+    def delete_actors(self, actor_ids: Iterable[int]) -> None:
+        for actor_id in actor_ids:
+            self._entities.pop(actor_id, None)
+            self._positions.pop(actor_id, None)
+            self._hidden.discard(actor_id)
+
+    @_counted
+    def hide_actors(self, actor_ids: Iterable[int]) -> None:
+        self._hidden.update(actor_ids)
+
+    @_counted
+    def get_actor_position(self, actor_id: int) -> Optional[Point]:
+        return self._positions.get(actor_id)
+
+    @_counted
+    def set_actor_position(self, actor_id: int, position: Point) -> None:
+        self._positions[actor_id] = position
+
+    @_counted
+    def find_closest_actors(self, position: Point, max_distance: float) -> List[int]:
+        """Returns visible actors within `max_distance` along the surface, closest first."""
+
+        radius = self.get_radius()
+        found = list()
+        for actor_id, other in self._positions.items():
+            if actor_id in self._hidden:
+                continue
+            distance = radius * _angle_between(position, other)
+            if distance <= max_distance:
+                found.append((distance, actor_id))
+        return [actor_id for _, actor_id in sorted(found)]
+
+
+class WorldExpositor:
+    def __init__(self, resource_dir: str, size: Tuple[int, int]) -> None:
+        self._resource_dir = resource_dir
+        self._size = size
+        self._renderers: Dict[int, str] = dict()
+        self._animations: Dict[int, str] = dict()
+        self._attachments: Dict[Tuple[int, int], Optional[int]] = dict()
+        self._highlighted: Optional[int] = None
+        self._bearing = 0.0
+        self._tilt = 0.0
+        self._zoom = 0.0
+        self.frames = 0
+
+    @_counted
+    def resize(self, width: int, height: int) -> None:
+        self._size = (width, height)
+
+    @_counted
+    def render(self, scene: Scene) -> None:
+        self.frames += 1
+
+    @_counted
+    def create_renderers(self, actors: Iterable[Actor]) -> None:
+        for actor in actors:
+            self._renderers[actor.id] = actor.entity_name
+
+    @_counted
+    def delete_renderers(self, actor_ids: Iterable[int]) -> None:
+        for actor_id in actor_ids:
+            self._renderers.pop(actor_id, None)
+            self._animations.pop(actor_id, None)
+
+    @_counted
+    def play_animation(self, actor_id: int, animation_name: str) -> None:
+        if actor_id in self._renderers:
+            self._animations[actor_id] = animation_name
+
+    @_counted
+    def attach_actor(self, attachement: int, actor_id: int, item_id: Optional[int]) -> None:
+        self._attachments[(actor_id, attachement)] = item_id
+
+    @_counted
+    def get_highlighted_actor_id(self) -> Optional[int]:
+        return self._highlighted
+
+    @_counted
+    def set_highlighted_actor_id(self, actor_id: int) -> None:
+        self._highlighted = actor_id
+
+    @_counted
+    def remove_highlight(self) -> None:
+        self._highlighted = None
+
+    @_counted
+    def get_bearing(self) -> float:
+        return self._bearing
+
+    @_counted
+    def rotate_by(self, angle: float) -> None:
+        self._bearing += angle
+
+    @_counted
+    def tilt_by(self, angle: float) -> None:
+        self._tilt += angle
+
+    @_counted
+    def zoom_by(self, amount: float) -> None:
+        self._zoom += amount
+
+
+def _angle_between(a: Point, b: Point) -> float:
+    # Spherical law of cosines, with theta measured from the pole.
+    cos_angle = math.cos(a.get_theta()) * math.cos(b.get_theta()) + math.sin(
+        a.get_theta()
+    ) * math.sin(b.get_theta()) * math.cos(a.get_phi() - b.get_phi())
+    return math.acos(max(-1.0, min(1.0, cos_angle)))
@@ -0,0 +1,95 @@
+"""
+Measures how many calls per second of the hot OpenGL functions can be issued through PyOpenGL and
+through the direct `ctypes` fast path of `glfast`. Needs an OpenGL context, so it opens a hidden
+window.
+"""
+
+import argparse, ctypes, timeit
+
+import numpy
+import pyglet
+
+from OpenGL import GL
+from OpenGL.GL import shaders
+
+from src import geometry, glfast
+
+_VERTEX_SHADER = """
+#version 300 es
+uniform mat4 uniModel;
+in vec4 inPosition;
+void main() { gl_Position = uniModel * inPosition; }
+"""
+
+_FRAGMENT_SHADER = """
+#version 300 es
+precision mediump float;
+out vec4 outColor;
+void main() { outColor = vec4(1.0); }
+"""
+
+
+def measure(number: int) -> dict:
+    texture = GL.glGenTextures(1)
+    buffer = GL.glGenBuffers(1)
+    vao = GL.glGenVertexArrays(1)
+    data = numpy.zeros(256, dtype=numpy.float32)
+    matrix = geometry.Matrices3D.identity()
+
+    GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer)
+    GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data, GL.GL_DYNAMIC_DRAW)
+
+    program = shaders.compileProgram(
+        shaders.compileShader(_VERTEX_SHADER.strip(), GL.GL_VERTEX_SHADER),
+        shaders.compileShader(_FRAGMENT_SHADER.strip(), GL.GL_FRAGMENT_SHADER),
+    )
+    GL.glUseProgram(program)
+    location = GL.glGetUniformLocation(program, "uniModel")
+
+    calls = {
+        "glBindTexture": lambda: glfast.glBindTexture(GL.GL_TEXTURE_2D, texture),
+        "glBindVertexArray": lambda: glfast.glBindVertexArray(vao),
+        "glBufferSubData": lambda: glfast.glBufferSubData(GL.GL_ARRAY_BUFFER, 0, data.nbytes, data),
+        "glUniformMatrix4fv": lambda: glfast.glUniformMatrix4fv(location, 1, GL.GL_TRUE, matrix),
+        "glDrawElements": lambda: glfast.glDrawElements(
+            GL.GL_TRIANGLES, 0, GL.GL_UNSIGNED_INT, ctypes.c_void_p(0)
+        ),
+    }
+
+    result = dict()
+    for name, call in calls.items():
+        seconds = min(timeit.repeat(call, number=number, repeat=3))
+        result[name] = number / seconds
+
+    GL.glFinish()
+    GL.glUseProgram(0)
+    GL.glDeleteProgram(program)
+    GL.glDeleteVertexArrays(1, [vao])
+    GL.glDeleteBuffers(1, [buffer])
+    GL.glDeleteTextures([texture])
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    window = pyglet.window.Window(visible=False)
+
+    glfast.use_fast_path(False)
+    slow = measure(args.number)
+    glfast.use_fast_path(True)
+    fast = measure(args.number)
+    glfast.use_fast_path(False)
+
+    print(f"{'function':>20} {'PyOpenGL':>14} {'ctypes':>14} {'speedup':>8}")
+    for name in slow:
+        speedup = fast[name] / slow[name]
+        print(f"{name:>20} {slow[name]:>12.0f}/s {fast[name]:>12.0f}/s {speedup:>7.1f}x")
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Reports how many draw calls `PlainRenderer` needs for an inventory-like layout: a background, a row
+of pockets with icons shared between pockets and a unique label texture per pocket.
+"""
+
+import argparse, timeit
+
+from src import formations, formations_renderer
+
+
+def build_plains(num_pockets: int, num_icons: int):
+    size = formations.Size(50.0, 50.0)
+    label_size = formations.Size(20.0, 20.0)
+    records = [formations.make_plain_record(1, None, 0.0, 0.0, formations.Size(1000.0, 100.0))]
+    for i in range(num_pockets):
+        icon = 2 + i % num_icons
+        label = 2 + num_icons + i
+        records.append(formations.make_plain_record(icon, None, 50.0 * i, 0.0, size))
+        records.append(formations.make_plain_record(label, None, 50.0 * i, 0.0, label_size))
+    return formations.records_to_array(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pockets", type=int, default=20, help="Number of pockets")
+    parser.add_argument("--icons", type=int, default=3, help="Number of distinct icons")
+    parser.add_argument("--repeat", type=int, default=10, help="Number of repetitions")
+    args = parser.parse_args()
+
+    plains = build_plains(args.pockets, args.icons)
+    print(f"Plains: {len(plains)}")
+
+    for name, limit in (("merged runs", 0), ("reordered", formations_renderer.REORDER_LIMIT)):
+        order, batches = formations_renderer.batch_plains(plains, limit)
+        timer = lambda: formations_renderer.batch_plains(plains, limit)
+        best = min(timeit.repeat(timer, number=1, repeat=args.repeat))
+        print(f"{name:>12}: {len(batches):4} draw calls, batching took {1000.0 * best:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares generation of vertex and index data for `PlainRenderer` from a list of `Plain` objects
+processed plain by plain against the array path processed with vectorized NumPy operations and
+against generation of instance data for `InstancedPlainRenderer`.
+"""
+
+import argparse, timeit
+
+import numpy
+
+from typing import List
+
+from src import formations, formations_renderer
+
+
+def build_formation(num_plains: int) -> formations.Formation:
+    columns = 100
+    rows = (num_plains + columns - 1) // columns
+    grid = formations.Grid(rows, columns)
+    for i in range(num_plains):
+        child = formations.Formation()
+        color = formations.Color(0.1, 0.2, 0.3, 1.0) if i % 2 else None
+        child.set_content(formations.Content(formations.Size(1.0, 1.0), i % 7 + 1, color))
+        grid.insert(child, i // columns, i % columns)
+    grid.resize(formations.Size(1920.0, 1080.0))
+    return grid
+
+
+def legacy_vertices(plains: List[formations.Plain]) -> numpy.ndarray:
+    DEFAULT_COLOR = (0.0, 0.0, 0.0, 0.0)
+
+    data = []
+    for plain in plains:
+        z = 0.5
+        x1, x2 = plain.position.x, plain.position.x + plain.size.width
+        y1, y2 = plain.position.y, plain.position.y + plain.size.height
+        r, g, b, a = plain.color.to_float_tuple() if plain.color is not None else DEFAULT_COLOR
+
+        if plain.flip_vertical:
+            t11, t12, t21, t22, t31, t32, t41, t42 = 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.0
+        else:
+            t11, t12, t21, t22, t31, t32, t41, t42 = 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 1.0, 1.0
+
+        # fmt: off
+        data.append([
+                x1, y1, z, r, g, b, a, t11, t12,
+                x1, y2, z, r, g, b, a, t21, t22,
+                x2, y2, z, r, g, b, a, t31, t32,
+                x2, y1, z, r, g, b, a, t41, t42,
+            ])
+        # fmt: on
+
+    return numpy.array(data, dtype=numpy.float32).flatten()
+
+
+def legacy_indices(num_plains: int) -> numpy.ndarray:
+    return numpy.array(
+        [4 * num + offset for num in range(num_plains) for offset in (0, 1, 2, 2, 3, 0)],
+        dtype=numpy.uint32,
+    )
+
+
+def run_legacy(formation: formations.Formation) -> None:
+    plains = formation.prepare_plains()
+    legacy_vertices(plains)
+    legacy_indices(len(plains))
+
+
+def run_vectorized(formation: formations.Formation) -> None:
+    plains = formation.prepare_plain_array()
+    formations_renderer.prepare_vertices(plains)
+    formations_renderer.prepare_indices(len(plains))
+
+
+def run_instanced(formation: formations.Formation) -> None:
+    plains = formation.prepare_plain_array()
+    formations_renderer.prepare_instances(plains)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plains", type=int, default=10000, help="Number of plains")
+    parser.add_argument("--repeat", type=int, default=10, help="Number of repetitions")
+    args = parser.parse_args()
+
+    formation = build_formation(args.plains)
+
+    legacy = formation.prepare_plains()
+    vectorized = formation.prepare_plain_array()
+    assert numpy.allclose(legacy_vertices(legacy), formations_renderer.prepare_vertices(vectorized))
+    assert numpy.array_equal(
+        legacy_indices(len(legacy)), formations_renderer.prepare_indices(len(vectorized))
+    )
+
+    vertex_bytes = formations_renderer.prepare_vertices(vectorized).nbytes
+    index_bytes = formations_renderer.prepare_indices(len(vectorized)).nbytes
+    instance_bytes = formations_renderer.prepare_instances(vectorized).nbytes
+
+    print(f"Plains: {len(vectorized)}")
+    print(f"Upload size: {vertex_bytes + index_bytes} bytes, instanced: {instance_bytes} bytes")
+    runs = (("legacy", run_legacy), ("vectorized", run_vectorized), ("instanced", run_instanced))
+    for name, function in runs:
+        best = min(timeit.repeat(lambda: function(formation), number=1, repeat=args.repeat))
+        print(f"{name:>12}: {1000.0 * best:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
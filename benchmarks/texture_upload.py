@@ -0,0 +1,108 @@
+"""
+Measures how many megabytes per second of PIL images reach a texture through `upload_image` and
+through the conversions used before it: a list of pixel tuples, `tinyarray` and pyglet's loader.
+Needs an OpenGL context, so it opens a hidden window.
+"""
+
+import argparse, os, tempfile, time
+
+import numpy
+import pyglet
+
+from OpenGL import GL
+from PIL import Image
+
+from typing import Callable, Dict
+
+from src import graphics
+
+
+def _via_pixel_list(texture_id: int, image: Image.Image) -> None:
+    data = numpy.array(list(image.getdata()), numpy.uint8)
+    _upload_array(texture_id, image.width, image.height, data)
+
+
+def _via_tinyarray(texture_id: int, image: Image.Image) -> None:
+    import tinyarray
+
+    data = numpy.array(tinyarray.array(image.getdata()))
+    _upload_array(texture_id, image.width, image.height, data)
+
+
+def _via_upload_image(texture_id: int, image: Image.Image) -> None:
+    graphics.upload_image(texture_id, image)
+
+
+def _upload_array(texture_id: int, width: int, height: int, data) -> None:
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+    GL.glTexImage2D(
+        GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, data
+    )
+    GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+
+def measure(image: Image.Image, path: str, repeat: int, slow: bool) -> Dict[str, float]:
+    texture_id = GL.glGenTextures(1)
+
+    def via_pyglet(texture_id: int, image: Image.Image) -> None:
+        loaded = pyglet.image.load(path)
+        _upload_array(texture_id, loaded.width, loaded.height, loaded.get_data())
+
+    def via_file(texture_id: int, image: Image.Image) -> None:
+        with Image.open(path) as loaded:
+            graphics.upload_image(texture_id, loaded, bottom_up=True)
+
+    uploads: Dict[str, Callable[[int, Image.Image], None]] = {
+        "upload_image": _via_upload_image,
+        "upload_image from file": via_file,
+        "pyglet from file": via_pyglet,
+    }
+    if slow:
+        uploads["pixel list"] = _via_pixel_list
+        try:
+            import tinyarray  # noqa: F401
+
+            uploads["tinyarray"] = _via_tinyarray
+        except ImportError:
+            pass
+
+    megabytes = 4 * image.width * image.height / 2**20
+    result = dict()
+    for name, upload in uploads.items():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            upload(texture_id, image)
+            GL.glFinish()
+            best = min(best, time.perf_counter() - start)
+        result[name] = megabytes / best
+
+    graphics.delete_texture(texture_id)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2048, help="Width and height of the image")
+    parser.add_argument("--repeat", type=int, default=3, help="Uploads per measurement")
+    parser.add_argument("--skip-slow", action="store_true", help="Skip the per-pixel conversions")
+    args = parser.parse_args()
+
+    window = pyglet.window.Window(visible=False)
+
+    pixels = numpy.random.default_rng(0).integers(0, 256, (args.size, args.size, 4), numpy.uint8)
+    image = Image.fromarray(pixels, "RGBA")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "image.png")
+        image.save(path)
+        result = measure(image, path, args.repeat, not args.skip_slow)
+
+    print(f"Image: {args.size}x{args.size} RGBA")
+    for name, speed in result.items():
+        print(f"{name:>24}: {speed:9.1f} MB/s")
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
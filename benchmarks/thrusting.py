@@ -0,0 +1,67 @@
+"""
+Measures the Python cost of `Thruster.thrust` and `Controls.handle_draw` per frame with the native
+renderer replaced by `ear_standin`, and reports how many native calls a frame makes.
+"""
+
+import argparse, math, os, tempfile, time, types
+
+from . import ear_standin
+
+# Has to happen before `src` imports the native module.
+ear_standin.install()
+
+from pyglet.window import key
+
+from src import benchmark, controls, media, motives, thruster
+
+
+def build_thruster(actors: int, movers: int) -> thruster.Thruster:
+    scene = ear_standin.Scene()
+    world = ear_standin.WorldExpositor("", (1280, 720))
+    with tempfile.TemporaryDirectory() as resource_dir:
+        os.mkdir(os.path.join(resource_dir, media.DIR_SOUNDS))
+        result = thruster.Thruster(scene, world, None, resource_dir)  # type: ignore
+
+    # Only the hero wanders in the scenario; movers replace that with real motion motives.
+    benchmark.SyntheticScenario(actor_count=actors, wander_ratio=actors).feed(0.0, result)
+    result.thrust()
+    for actor_id in range(movers):
+        bearing = 2.0 * math.pi * actor_id / max(movers, 1)
+        action = types.SimpleNamespace(actor_id=actor_id, speed=1.0, bearing=bearing, duration=None)
+        result.add(motives.MotionMotive(action))  # type: ignore
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--actors", type=int, default=200, help="Number of actors in the scene")
+    parser.add_argument("--movers", type=int, default=50, help="Number of moving actors")
+    parser.add_argument("--frames", type=int, default=1000, help="Number of frames")
+    args = parser.parse_args()
+
+    thrust = build_thruster(args.actors, args.movers)
+    world = thrust.context.world
+    keys = controls.Controls(world, None, None)  # type: ignore
+    keys.handle_key_press(key.E, 0)
+
+    ear_standin.reset_calls()
+    thrust_time = controls_time = 0.0
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        keys.handle_draw()
+        middle = time.perf_counter()
+        thrust.thrust()
+        end = time.perf_counter()
+        controls_time += middle - start
+        thrust_time += end - middle
+
+    print(f"Actors: {args.actors}, movers: {args.movers}, frames: {args.frames}")
+    print(f"{'thrust':>40}: {1e6 * thrust_time / args.frames:9.1f} us/frame")
+    print(f"{'controls':>40}: {1e6 * controls_time / args.frames:9.1f} us/frame")
+    print("Native calls per frame:")
+    for name, count in ear_standin.calls.most_common():
+        print(f"{name:>40}: {count / args.frames:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
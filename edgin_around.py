@@ -1,13 +1,45 @@
 #!/usr/bin/env python
 
-import argparse
+import argparse, os, sys
+
+
+def _is_benchmark(argv: list) -> bool:
+    return any(arg == "--benchmark" or arg.startswith("--benchmark=") for arg in argv)
+
+
+# The benchmark renders offscreen, which has to be chosen before pyglet and PyOpenGL get loaded.
+if _is_benchmark(sys.argv[1:]):
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    import pyglet
+
+    pyglet.options["headless"] = True
 
 import src
 
+from typing import Optional
+
+
+def _default_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "edgin_around", "shaders")
+
+
+def _default_bundle_path() -> str:
+    return os.path.join(os.path.dirname(_default_cache_dir()), "resources.bundle")
+
 
 class Config:
-    def __init__(self, resource_dir: str) -> None:
+    def __init__(
+        self,
+        resource_dir: str,
+        options: src.Options,
+        benchmark_stream: Optional[str] = None,
+        benchmark_report: Optional[str] = None,
+    ) -> None:
         self.resource_dir = resource_dir
+        self.options = options
+        self.benchmark_stream = benchmark_stream
+        self.benchmark_report = benchmark_report
 
     @staticmethod
     def from_arguments() -> "Config":
@@ -19,11 +51,242 @@ class Config:
             default="/usr/share/edgin_around/resources/",
             help="Path to resources",
         )
+        parser.add_argument(
+            "--instanced",
+            dest="instanced_rendering",
+            action="store_true",
+            help="Render formations with instanced quads",
+        )
+        parser.add_argument(
+            "--sdf-text",
+            dest="sdf_text",
+            action="store_true",
+            help="Draw labels from a shared glyph atlas instead of rasterizing each of them",
+        )
+        parser.add_argument(
+            "--label-cache-mb",
+            dest="label_cache_mb",
+            type=float,
+            default=16.0,
+            help="Memory for reusable label textures in megabytes, 0 to not share label textures",
+        )
+        parser.add_argument(
+            "--gpu-budget-mb",
+            dest="gpu_budget_mb",
+            type=float,
+            default=512.0,
+            help="GPU memory in megabytes above which unused textures are evicted, 0 for no limit",
+        )
+        parser.add_argument(
+            "--fast-gl",
+            dest="fast_gl",
+            action="store_true",
+            help="Call hot OpenGL functions directly, without error checking",
+        )
+        parser.add_argument(
+            "--pbo-uploads",
+            dest="pixel_buffer_uploads",
+            action="store_true",
+            help="Upload textures through pixel buffer objects",
+        )
+        parser.add_argument(
+            "--upload-budget",
+            dest="upload_budget",
+            type=float,
+            default=4.0,
+            metavar="MS",
+            help="Milliseconds per frame for uploading images loaded in the background",
+        )
+
+        parser.add_argument(
+            "--max-fps",
+            dest="max_fps",
+            type=float,
+            default=0.0,
+            help="Maximal frame rate, 0 for no limit",
+        )
+        parser.add_argument(
+            "--idle-fps",
+            dest="idle_fps",
+            type=float,
+            default=10.0,
+            help="Frame rate while nothing changes, 0 to keep the full frame rate",
+        )
+        parser.add_argument(
+            "--no-vsync",
+            dest="vsync",
+            action="store_false",
+            help="Do not synchronize frames with the display refresh",
+        )
+
+        parser.add_argument(
+            "--world-scale",
+            dest="world_scale",
+            type=float,
+            nargs=2,
+            metavar=("MIN", "MAX"),
+            default=(1.0, 1.0),
+            help="Bounds of the world resolution relative to the window, adjusted to keep frame rate",
+        )
+        parser.add_argument(
+            "--target-fps",
+            dest="target_fps",
+            type=float,
+            default=60.0,
+            help="Frame rate kept by the world resolution scaling",
+        )
+
+        parser.add_argument(
+            "--shader-cache",
+            dest="shader_cache_dir",
+            type=str,
+            default=_default_cache_dir(),
+            help="Directory for caching compiled shader programs",
+        )
+        parser.add_argument(
+            "--no-shader-cache",
+            dest="shader_cache_dir",
+            action="store_const",
+            const=None,
+            help="Always compile shader programs",
+        )
+        parser.add_argument(
+            "--resource-bundle",
+            dest="resource_bundle",
+            type=str,
+            default=_default_bundle_path(),
+            help="File for keeping decoded images and sounds between launches",
+        )
+        parser.add_argument(
+            "--no-resource-bundle",
+            dest="resource_bundle",
+            action="store_const",
+            const=None,
+            help="Always decode images and sounds",
+        )
+
+        parser.add_argument(
+            "--profile",
+            dest="profile",
+            action="store_true",
+            help="Measure phases of frames",
+        )
+        parser.add_argument(
+            "--profile-overlay",
+            dest="profile_overlay",
+            action="store_true",
+            help="Show frame phase timings on screen",
+        )
+        parser.add_argument(
+            "--profile-dump",
+            dest="profile_dump",
+            type=str,
+            default=None,
+            help="Periodically write frame phase timings to this JSON file",
+        )
+
+        parser.add_argument(
+            "--slow-frame",
+            dest="slow_frame_ms",
+            type=float,
+            default=None,
+            metavar="MS",
+            help="Save stack samples of frames taking longer than this many milliseconds",
+        )
+        parser.add_argument(
+            "--slow-frame-dir",
+            dest="slow_frame_dir",
+            type=str,
+            default="slow_frames",
+            help="Directory for slow frame captures",
+        )
+
+        parser.add_argument(
+            "--record",
+            dest="record_path",
+            type=str,
+            default=None,
+            help="Write messages received from the server to this file",
+        )
+        parser.add_argument(
+            "--benchmark",
+            dest="benchmark_frames",
+            type=int,
+            default=None,
+            metavar="FRAMES",
+            help="Render this many frames offscreen with no server and print a performance report",
+        )
+        parser.add_argument(
+            "--benchmark-stream",
+            dest="benchmark_stream",
+            type=str,
+            default=None,
+            help="Recording (see --record) replayed by the benchmark instead of a synthetic scene",
+        )
+        parser.add_argument(
+            "--benchmark-report",
+            dest="benchmark_report",
+            type=str,
+            default=None,
+            help="Also write the benchmark report to this JSON file",
+        )
+        parser.add_argument(
+            "--size",
+            dest="window_size",
+            type=int,
+            nargs=2,
+            metavar=("WIDTH", "HEIGHT"),
+            default=None,
+            help="Window size instead of a maximized window (1280x720 in benchmarks)",
+        )
 
         args = parser.parse_args()
-        return Config(args.resource_dir)
+        world_scale_min, world_scale_max = args.world_scale
+        if not 0.0 < world_scale_min <= world_scale_max:
+            parser.error("World scale bounds must be positive and ordered")
+        if args.target_fps <= 0.0:
+            parser.error("Target frame rate must be positive")
+        if args.benchmark_frames is not None and args.benchmark_frames < 1:
+            parser.error("Benchmark needs at least one frame")
+
+        window_size = args.window_size
+        if window_size is None and args.benchmark_frames is not None:
+            window_size = (1280, 720)
+
+        options = src.Options(
+            instanced_rendering=args.instanced_rendering,
+            sdf_text=args.sdf_text,
+            label_cache_mb=args.label_cache_mb or None,
+            gpu_budget_mb=args.gpu_budget_mb or None,
+            fast_gl=args.fast_gl,
+            pixel_buffer_uploads=args.pixel_buffer_uploads,
+            asset_upload_budget=args.upload_budget / 1000.0,
+            max_fps=args.max_fps or None,
+            idle_fps=args.idle_fps or None,
+            vsync=args.vsync,
+            world_scale_min=world_scale_min,
+            world_scale_max=world_scale_max,
+            target_fps=args.target_fps,
+            shader_cache_dir=args.shader_cache_dir,
+            resource_bundle=args.resource_bundle,
+            profile=args.profile,
+            profile_overlay=args.profile_overlay,
+            profile_dump=args.profile_dump,
+            slow_frame_budget=None if args.slow_frame_ms is None else args.slow_frame_ms / 1000.0,
+            slow_frame_dir=args.slow_frame_dir,
+            window_size=window_size,
+            record_path=args.record_path,
+            benchmark_frames=args.benchmark_frames,
+        )
+        return Config(args.resource_dir, options, args.benchmark_stream, args.benchmark_report)
 
 
 if __name__ == "__main__":
     config = Config.from_arguments()
-    src.Game(resource_dir=config.resource_dir).run()
+    game = src.Game(resource_dir=config.resource_dir, options=config.options)
+    if config.options.benchmark_frames is not None:
+        game.benchmark(
+            config.options.benchmark_frames, config.benchmark_stream, config.benchmark_report
+        )
+    else:
+        game.run()
@@ -4,6 +4,8 @@ function usage() {
     echo 'Commands:'
     echo ' - mypy - runs mypy checker in the main app'
     echo ' - black - runs `black` code formatter'
+    echo ' - bench <name> - runs benchmark from the `benchmarks` directory'
+    echo ' - mipmaps <image>... - generates mipmap levels of images ahead of time'
 }
 
 function run_mypy() {
@@ -14,6 +16,16 @@ function run_black() {
     python -m black . --config black.toml
 }
 
+function run_bench() {
+    name=$1
+    shift
+    python -m benchmarks.$name $@
+}
+
+function run_mipmaps() {
+    python -m tools.mipmaps $@
+}
+
 if (( $# > 0 )); then
     command=$1
     shift
@@ -25,6 +37,12 @@ if (( $# > 0 )); then
         'black')
             run_black $@
             ;;
+        'bench')
+            run_bench $@
+            ;;
+        'mipmaps')
+            run_mipmaps $@
+            ;;
         *)
             echo "Command \"$command\" unknown."
             echo
@@ -8,8 +8,14 @@ in highp vec2 shTexCoords;
 out highp vec4 outColor;
 
 void main(void) {
-    if (shColor.a != 0.0) {
+    if (shColor.a > 0.0) {
         outColor = shColor;
+    } else if (shColor.a < 0.0) {
+        // Glyph: the red channel holds a distance field with the outline at 128.
+        highp float distance = texture(sampler, shTexCoords).r;
+        highp float width = max(fwidth(distance), 0.001);
+        highp float alpha = smoothstep(0.502 - width, 0.502 + width, distance);
+        outColor = vec4(shColor.rgb, -shColor.a * alpha);
     } else {
         outColor = texture(sampler, shTexCoords);
     }
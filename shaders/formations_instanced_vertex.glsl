@@ -0,0 +1,22 @@
+#version 300 es
+
+uniform mat4 uniView;
+
+layout(location = 0) in vec2 inCorner;
+layout(location = 1) in vec4 inRect;
+layout(location = 2) in vec4 inTexRect;
+layout(location = 3) in vec4 inColor;
+
+out highp vec4 shColor;
+out highp vec2 shTexCoords;
+
+void main(void) {
+    vec2 position = inRect.xy + inCorner * inRect.zw;
+    gl_Position = uniView * vec4(position, 0.5, 1);
+
+    shColor = inColor;
+    shTexCoords = vec2(
+        mix(inTexRect.x, inTexRect.z, inCorner.x),
+        mix(inTexRect.w, inTexRect.y, inCorner.y)
+    );
+}
@@ -1 +1,2 @@
 from .game import Game
+from .options import Options
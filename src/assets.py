@@ -0,0 +1,229 @@
+import concurrent.futures, functools, os, time
+
+import numpy
+import pyglet
+
+from OpenGL import GL
+from PIL import Image
+
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from . import bundle, gpu_resources, graphics
+
+# Called once a level of a texture is fully uploaded.
+LoadedCallback = Callable[[], None]
+
+# Texture and level with pixels still being decoded (no level for textures without mipmaps), the
+# decoded pixels (rows by columns by RGBA) and the callback of the level.
+_PendingTexture = Tuple[
+    int, Optional[int], "concurrent.futures.Future[numpy.ndarray]", Optional[LoadedCallback]
+]
+
+
+class _TextureUpload:
+    """
+    Decoded pixels going into a texture level a strip of rows at a time. Without a level, the pixels
+    are the whole of a texture without mipmaps.
+    """
+
+    STRIP_BYTES = 2**20
+
+    def __init__(
+        self,
+        texture_id: int,
+        pixels: numpy.ndarray,
+        level: Optional[int] = None,
+        on_loaded: Optional[LoadedCallback] = None,
+    ) -> None:
+        self._texture_id = texture_id
+        self._pixels = pixels
+        self._level = level
+        self._on_loaded = on_loaded
+        self._height, self._width = pixels.shape[:2]
+        self._row = 0
+
+    def is_done(self) -> bool:
+        return self._row >= self._height
+
+    def step(self) -> int:
+        """Uploads the next strip and returns its size in bytes."""
+
+        if self._row == 0:
+            # Replaces the placeholder with storage of the full size.
+            if self._level is None:
+                graphics.allocate_plain_texture(self._texture_id, self._width, self._height)
+            else:
+                graphics.allocate_texture(self._texture_id, self._width, self._height, self._level)
+
+        rows = min(max(1, self.STRIP_BYTES // (4 * self._width)), self._height - self._row)
+        strip = self._pixels[self._row : self._row + rows]
+        graphics.upload_pixels(
+            self._texture_id, 0, self._row, self._width, rows, strip, self._level or 0
+        )
+
+        self._row += rows
+        if self.is_done() and self._on_loaded is not None:
+            self._on_loaded()
+        return strip.nbytes
+
+
+class AssetLoader:
+    """
+    Decodes images and sounds on a pool of worker threads.
+
+    Textures are created at once with a single placeholder pixel, so they can be used right away.
+    Decoded pixels are uploaded into them on the GL thread by `upload`, which is called once a frame
+    and stops after `budget` seconds. Large images are uploaded in strips of rows, so a frame never
+    takes much longer than the budget, and fill their texture over several frames.
+    """
+
+    BUDGET = 0.004
+    PLACEHOLDER_COLOR = (128, 128, 128, 128)
+
+    def __init__(
+        self,
+        budget: float = BUDGET,
+        workers: int = min(4, os.cpu_count() or 1),
+        resource_bundle: Optional[bundle.ResourceBundle] = None,
+    ) -> None:
+        self._budget = budget
+        self._bundle = resource_bundle
+        self._bundle_save: Optional[concurrent.futures.Future] = None
+        self._pool = concurrent.futures.ThreadPoolExecutor(workers, "AssetLoader")
+        self._jobs: List[concurrent.futures.Future] = list()
+        self._pending: List[_PendingTexture] = list()
+        self._uploads: List[_TextureUpload] = list()
+        self._placeholder = Image.new("RGBA", (1, 1), self.PLACEHOLDER_COLOR)
+
+        self.uploaded_bytes = 0
+
+    def create_texture(
+        self,
+        make_image: Callable[[], Image.Image],
+        bottom_up: bool = False,
+        name: Optional[str] = None,
+        sources: Sequence[str] = (),
+    ) -> int:
+        """
+        Returns a texture showing the placeholder until the image returned by `make_image`, which
+        is called on a worker thread, is loaded. If a `name` is given, the pixels are taken from
+        the resource bundle as long as the `sources` files the image is made of do not change.
+        """
+
+        texture_id = GL.glGenTextures(1)
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, texture_id, "images")
+        graphics.upload_image(texture_id, self._placeholder)
+        self._load(texture_id, None, make_image, bottom_up, name, sources)
+        return texture_id
+
+    def load_level(
+        self,
+        texture_id: int,
+        level: int,
+        make_image: Callable[[], Image.Image],
+        bottom_up: bool = False,
+        name: Optional[str] = None,
+        sources: Sequence[str] = (),
+        on_loaded: Optional[LoadedCallback] = None,
+    ) -> None:
+        """
+        Loads the image returned by `make_image` into a mipmap level of an existing texture, the
+        same way as `create_texture` does. `on_loaded` is called on the GL thread once the whole
+        level is uploaded.
+        """
+
+        self._load(texture_id, level, make_image, bottom_up, name, sources, on_loaded)
+
+    def _load(
+        self,
+        texture_id: int,
+        level: Optional[int],
+        make_image: Callable[[], Image.Image],
+        bottom_up: bool,
+        name: Optional[str],
+        sources: Sequence[str],
+        on_loaded: Optional[LoadedCallback] = None,
+    ) -> None:
+        prepare = functools.partial(_prepare_pixels, make_image, bottom_up)
+        if self._bundle is not None and name is not None:
+            future = self._pool.submit(self._bundle.get_pixels, name, sources, prepare)
+        else:
+            future = self._pool.submit(prepare)
+
+        self._pending.append((texture_id, level, future, on_loaded))
+        self._jobs.append(future)
+
+    def load_sound(self, path: str) -> "concurrent.futures.Future[pyglet.media.Source]":
+        if self._bundle is not None:
+            future = self._pool.submit(self._bundle.get_sound, path)
+        else:
+            future = self._pool.submit(pyglet.media.load, path, streaming=False)
+        self._jobs.append(future)
+        return future
+
+    def is_loading(self) -> bool:
+        """Tells if any textures are still waiting for their pixels."""
+
+        return len(self._pending) > 0 or len(self._uploads) > 0
+
+    def upload(self) -> bool:
+        """Uploads decoded pixels within the budget. Returns `True` if any texture changed."""
+
+        start = time.perf_counter()
+        self._collect_decoded()
+        self._save_bundle_when_done()
+
+        uploaded = False
+        while len(self._uploads) > 0:
+            if uploaded and time.perf_counter() - start > self._budget:
+                break
+
+            self.uploaded_bytes += self._uploads[0].step()
+            uploaded = True
+            if self._uploads[0].is_done():
+                self._uploads.pop(0)
+
+        return uploaded
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _save_bundle_when_done(self) -> None:
+        self._jobs = [job for job in self._jobs if not job.done()]
+        if self._bundle is None or len(self._jobs) > 0 or not self._bundle.is_modified():
+            return
+
+        # Entries used while a save is writing are saved by the next one, started once it is done.
+        if self._bundle_save is None or self._bundle_save.done():
+            self._bundle_save = self._pool.submit(self._bundle.save)
+
+    def _collect_decoded(self) -> None:
+        still_pending: List[_PendingTexture] = list()
+        for pending in self._pending:
+            texture_id, level, future, on_loaded = pending
+            if not future.done():
+                still_pending.append(pending)
+                continue
+
+            try:
+                self._uploads.append(_TextureUpload(texture_id, future.result(), level, on_loaded))
+            except Exception as error:
+                print(f"Failed to load an image: {error}")
+
+        self._pending = still_pending
+
+    def __repr__(self) -> str:
+        return (
+            f"AssetLoader(pending: {len(self._pending) + len(self._uploads)}, "
+            f"uploaded: {self.uploaded_bytes})"
+        )
+
+
+def _prepare_pixels(make_image: Callable[[], Image.Image], bottom_up: bool) -> numpy.ndarray:
+    # Conversions happen here, off the GL thread, so that uploading only copies rows.
+    image = make_image()
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    if bottom_up:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    return numpy.asarray(image)
@@ -0,0 +1,216 @@
+import json, math, random, sys, time
+
+import numpy, pyglet
+
+from OpenGL import GL
+
+from typing import Any, Dict, List, Optional
+
+import edgin_around_rendering as ear
+from edgin_around_api import geometry
+from . import connector, glfast, gpu_resources, gui, motives, profiling, thrusting, thruster, window
+
+# Entities of the synthetic scene. The first one is the hero.
+ENTITIES = ("pirate", "spruce", "rocks")
+
+
+class MessageReplay:
+    """Replays messages written by `connector.MessageRecorder` at their recorded times."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "r") as recording_file:
+            entries = [json.loads(line) for line in recording_file if line.strip()]
+        self._entries = [(float(e["time"]), str(e["message"])) for e in entries]
+        self._next = 0
+
+    def feed(self, elapsed: float, thruster: thruster.Thruster) -> None:
+        while self._next < len(self._entries) and self._entries[self._next][0] <= elapsed:
+            connector.process_message(self._entries[self._next][1], thruster)
+            self._next += 1
+
+    def __repr__(self) -> str:
+        return f"MessageReplay({self._next}/{len(self._entries)})"
+
+
+class _SceneSetupMotive(motives.Motive):
+    """Configures the scene and scatters actors around the hero."""
+
+    RADIUS = 100.0
+    SPREAD = 0.1
+
+    def __init__(self, actor_count: int, seed: int) -> None:
+        super().__init__(None)
+        self._actor_count = actor_count
+        self._seed = seed
+
+    def tick(self, interval, context: thrusting.MotiveContext) -> None:
+        rng = random.Random(self._seed)
+        actors = list()
+        for actor_id in range(self._actor_count):
+            theta = 0.5 * math.pi + (rng.uniform(-self.SPREAD, self.SPREAD) if actor_id else 0.0)
+            phi = rng.uniform(-self.SPREAD, self.SPREAD) if actor_id else 0.0
+            entity = ENTITIES[0] if actor_id == 0 else rng.choice(ENTITIES[1:])
+            actors.append(ear.Actor(actor_id, entity, ear.Point(theta, phi)))
+
+        context.scene.configure(0, ear.ElevationFunction(self.RADIUS))
+        context.scene.create_actors(actors)
+        context.world.create_renderers(actors)
+        self.expire()
+
+
+class _WanderMotive(motives.Motive):
+    """Walks an actor around, turning at random intervals."""
+
+    SPEED = 1.0
+
+    def __init__(self, actor_id: int, seed: int) -> None:
+        super().__init__(None)
+        self._actor_id = actor_id
+        self._rng = random.Random(seed)
+        self._bearing = 0.0
+        self._turn_countdown = 0.0
+
+    def get_actor_id(self) -> int:
+        return self._actor_id
+
+    def tick(self, interval, context: thrusting.MotiveContext) -> None:
+        position = context.scene.get_actor_position(self._actor_id)
+        if position is None:
+            return
+
+        self._turn_countdown -= interval
+        if self._turn_countdown <= 0.0:
+            self._bearing = self._rng.uniform(-math.pi, math.pi)
+            self._turn_countdown = self._rng.uniform(0.5, 3.0)
+            context.world.play_animation(self._actor_id, motives.AnimationName.WALK)
+
+        point = geometry.Point(position.get_theta(), position.get_phi())
+        moved = point.moved_by(self.SPEED * interval, self._bearing, context.scene.get_radius())
+        context.scene.set_actor_position(self._actor_id, ear.Point(moved.theta, moved.phi))
+
+
+class SyntheticScenario:
+    """
+    Builds a scene without a server: the hero and `actor_count - 1` other actors, of which every
+    `wander_ratio`-th one keeps walking around. Motives are created directly, as the benchmark
+    should not depend on the message format of a particular server version.
+    """
+
+    def __init__(self, actor_count: int = 200, wander_ratio: int = 4, seed: int = 0) -> None:
+        self._actor_count = actor_count
+        self._wander_ratio = wander_ratio
+        self._seed = seed
+        self._started = False
+
+    def feed(self, elapsed: float, thruster: thruster.Thruster) -> None:
+        if self._started:
+            return
+        self._started = True
+
+        thruster.add(_SceneSetupMotive(self._actor_count, self._seed))
+        for actor_id in range(0, self._actor_count, self._wander_ratio):
+            thruster.add(_WanderMotive(actor_id, self._seed + actor_id))
+
+    def __repr__(self) -> str:
+        return f"SyntheticScenario(actors: {self._actor_count})"
+
+
+class Benchmark:
+    """
+    Renders a fixed number of frames of the complete client as fast as possible, feeding the
+    thruster from a `MessageReplay` or a `SyntheticScenario`, and reports frame rate percentiles,
+    phase times, peak memory usage and draw calls.
+    """
+
+    def __init__(
+        self,
+        window: window.Window,
+        gui: gui.Gui,
+        thruster: thruster.Thruster,
+        profiler: profiling.Profiler,
+        source: Any,
+        frames: int,
+    ) -> None:
+        assert profiler.is_enabled(), "The benchmark needs an enabled profiler"
+        self._window = window
+        self._gui = gui
+        self._thruster = thruster
+        self._profiler = profiler
+        self._source = source
+        self._frames = frames
+
+    def run(self) -> Dict[str, Any]:
+        draw_calls: List[int] = list()
+        texture_binds: List[int] = list()
+
+        self._window.switch_to()
+        self._window.dispatch_event("on_resize", self._window.width, self._window.height)
+
+        start = time.monotonic()
+        for _ in range(self._frames):
+            self._source.feed(time.monotonic() - start, self._thruster)
+            pyglet.clock.tick()
+            self._window.dispatch_events()
+            # Dispatched events may get queued, so the handler is called directly.
+            self._window.on_draw()
+            self._window.flip()
+
+            stats = self._gui.get_render_stats()
+            draw_calls.append(stats.draw_calls)
+            texture_binds.append(stats.texture_binds)
+
+        GL.glFinish()
+        duration = time.monotonic() - start
+        return self._make_report(duration, draw_calls, texture_binds)
+
+    def _make_report(
+        self, duration: float, draw_calls: List[int], texture_binds: List[int]
+    ) -> Dict[str, Any]:
+        phases = self._profiler.summarize()
+
+        # Slow frames make low frame rates, so the frame rate percentiles mirror interval ones.
+        fps: Dict[str, float] = {"mean": self._frames / duration}
+        interval = phases.get(profiling.Profiler.INTERVAL)
+        if interval is not None:
+            for p in profiling.PERCENTILES:
+                fps[f"p{100 - p}"] = 1000.0 / interval[f"p{p}"]
+
+        max_rss = self._get_max_rss()
+        return {
+            "frames": self._frames,
+            "duration": duration,
+            "size": [self._window.width, self._window.height],
+            "source": repr(self._source),
+            "renderer": (GL.glGetString(GL.GL_RENDERER) or b"").decode(),
+            "fast_gl": glfast.is_fast_path_enabled(),
+            "fps": fps,
+            "phases": phases,
+            "max_rss_mb": max_rss / 2**20 if max_rss is not None else None,
+            "draw_calls": self._describe(draw_calls),
+            "texture_binds": self._describe(texture_binds),
+            "label_cache": self._gui.get_label_cache_stats(),
+            "gpu_memory": gpu_resources.RESOURCES.get_stats(),
+        }
+
+    @staticmethod
+    def _describe(values: List[int]) -> Dict[str, float]:
+        array = numpy.array(values, dtype=numpy.float64)
+        return {"mean": float(array.mean()), "max": float(array.max())}
+
+    @staticmethod
+    def _get_max_rss() -> Optional[int]:
+        # `resource` is Unix-only, so it is imported here to not be needed for starting the game.
+        try:
+            import resource
+        except ImportError:
+            return None
+
+        # Linux reports kilobytes, macOS bytes.
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else 1024 * max_rss
+
+
+def load_source(stream_path: Optional[str]) -> Any:
+    """Returns a replay of the given recording, or the synthetic scenario if no path is given."""
+
+    return MessageReplay(stream_path) if stream_path is not None else SyntheticScenario()
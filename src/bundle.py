@@ -0,0 +1,237 @@
+import hashlib, json, mmap, os, struct, tempfile, threading
+
+import numpy
+import pyglet
+
+from pyglet.media.codecs import base as media_base
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Magic, offset and length of the index, which is JSON stored after the data.
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"EABNDL01"
+
+# Metadata of an entry and its data.
+_Entry = Tuple[Dict[str, Any], Any]
+
+
+class ResourceBundle:
+    """
+    Decoded resources stored in a single file between launches: pixels ready to be uploaded and PCM
+    samples of sounds.
+
+    The file is memory-mapped, so pixels go from the page cache straight to the texture upload.
+    Entries are stored by name together with the sizes, modification times and a hash of their
+    source files. An entry whose sources changed is decoded again. `save` rewrites the file with the
+    entries used since it was opened, so stale entries do not accumulate.
+    """
+
+    ALIGNMENT = 4096
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = dict()
+        self._mapping: Optional[mmap.mmap] = None
+        self._used: Dict[str, _Entry] = dict()
+        self._is_modified = False
+
+        self.hits = 0
+        self.misses = 0
+
+        self._open()
+
+    def get_pixels(
+        self, name: str, sources: Sequence[str], decode: Callable[[], numpy.ndarray]
+    ) -> numpy.ndarray:
+        """
+        Returns pixels (rows by columns by RGBA) stored under `name`. If there are none or the
+        sources changed, calls `decode` and stores the result. May be called from any thread.
+        """
+
+        stamp = self._get_stamp(sources)
+        with self._lock:
+            entry = self._find(name, stamp)
+            if entry is not None:
+                meta, data = entry
+                return numpy.frombuffer(data, numpy.uint8).reshape(meta["shape"])
+
+        pixels = numpy.ascontiguousarray(decode())
+        meta = dict(stamp, hash=_hash_files(sources), shape=list(pixels.shape))
+        with self._lock:
+            self._used[name] = (meta, pixels)
+            self._is_modified = True
+        return pixels
+
+    def get_sound(self, path: str) -> pyglet.media.Source:
+        """Returns the decoded sound from the file, decoding it only if it is not stored yet."""
+
+        stamp = self._get_stamp([path])
+        with self._lock:
+            entry = self._find(path, stamp)
+            if entry is not None:
+                meta, data = entry
+                audio_format = media_base.AudioFormat(*meta["format"])
+                return media_base.StaticMemorySource(bytes(data), audio_format)
+
+        source = pyglet.media.load(path, streaming=False)
+        audio_format = source.audio_format
+        if audio_format is None:
+            # Samples without a format could not be played back from the bundle.
+            return source
+
+        # Pyglet keeps decoded samples of static sources in `_data`.
+        samples = source._data or b""
+        sound_format = [audio_format.channels, audio_format.sample_size, audio_format.sample_rate]
+        meta = dict(stamp, hash=_hash_files([path]), format=sound_format)
+        with self._lock:
+            self._used[path] = (meta, numpy.frombuffer(samples, numpy.uint8))
+            self._is_modified = True
+        return source
+
+    def is_modified(self) -> bool:
+        """Tells if `save` would change the file."""
+
+        with self._lock:
+            return self._is_modified
+
+    def save(self) -> None:
+        """
+        Writes the used entries to the file. May be called from any thread; saves started while
+        another one is writing wait for it, then write the entries used by then.
+        """
+
+        with self._save_lock:
+            self._save()
+
+    def _save(self) -> None:
+        with self._lock:
+            entries = dict(self._used)
+            self._is_modified = False
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        index: Dict[str, Dict[str, Any]] = dict()
+        temporary_path = ""
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(
+                ".tmp", os.path.basename(self._path) + ".", directory or None
+            )
+            with os.fdopen(descriptor, "wb") as bundle_file:
+                bundle_file.write(_HEADER.pack(_MAGIC, 0, 0))
+                for name, (meta, data) in entries.items():
+                    offset = self._align(bundle_file.tell())
+                    bundle_file.seek(offset)
+                    bundle_file.write(memoryview(data).cast("B"))
+                    index[name] = dict(meta, offset=offset, length=memoryview(data).nbytes)
+
+                index_data = json.dumps(index).encode()
+                index_offset = bundle_file.tell()
+                bundle_file.write(index_data)
+                bundle_file.seek(0)
+                bundle_file.write(_HEADER.pack(_MAGIC, index_offset, len(index_data)))
+
+            # Mapped views of the replaced file stay valid, as the mapping keeps it alive.
+            os.replace(temporary_path, self._path)
+        except OSError as error:
+            print(f"Failed to save the resource bundle: {error}")
+            if temporary_path and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+
+        self._remap(entries)
+
+    def _remap(self, saved: Dict[str, _Entry]) -> None:
+        # Entries refer to the new mapping instead of decoded data, which can then be freed.
+        previous_mapping = self._mapping
+        self._open()
+        if self._mapping is None or self._mapping is previous_mapping:
+            return
+
+        with self._lock:
+            for name, entry in saved.items():
+                meta = self._index.get(name)
+                if meta is not None and self._used.get(name) is entry:
+                    offset, length = meta["offset"], meta["length"]
+                    self._used[name] = (meta, memoryview(self._mapping)[offset : offset + length])
+
+    def _open(self) -> None:
+        try:
+            with open(self._path, "rb") as bundle_file:
+                if os.fstat(bundle_file.fileno()).st_size < _HEADER.size:
+                    return
+                mapping = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return
+
+        magic, index_offset, index_length = _HEADER.unpack_from(mapping)
+        try:
+            if magic != _MAGIC:
+                raise ValueError("unknown format")
+            index = json.loads(mapping[index_offset : index_offset + index_length])
+        except ValueError as error:
+            print(f"Ignoring the resource bundle '{self._path}': {error}")
+            return
+
+        with self._lock:
+            self._index = index
+            self._mapping = mapping
+
+    def _find(self, name: str, stamp: Dict[str, Any]) -> Optional[_Entry]:
+        entry = self._used.get(name)
+        if entry is None and self._mapping is not None:
+            meta = self._index.get(name)
+            if meta is not None:
+                offset, length = meta["offset"], meta["length"]
+                entry = (meta, memoryview(self._mapping)[offset : offset + length])
+
+        if entry is None or not self._is_current(entry[0], stamp):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if entry[0]["stats"] != stamp["stats"]:
+            # Same contents with new modification times; stored times are refreshed on save.
+            entry = (dict(entry[0], stats=stamp["stats"]), entry[1])
+            self._is_modified = True
+        self._used[name] = entry
+        return entry
+
+    @staticmethod
+    def _is_current(meta: Dict[str, Any], stamp: Dict[str, Any]) -> bool:
+        if meta.get("sources") != stamp["sources"]:
+            return False
+        if meta.get("stats") == stamp["stats"]:
+            return True
+        return meta.get("hash") == _hash_files(stamp["sources"])
+
+    @staticmethod
+    def _get_stamp(sources: Sequence[str]) -> Dict[str, Any]:
+        # Files are only hashed when their sizes or modification times differ from the stored ones.
+        stats: List[List[int]] = list()
+        for source in sources:
+            stat = os.stat(source)
+            stats.append([stat.st_size, stat.st_mtime_ns])
+        return {"sources": list(sources), "stats": stats}
+
+    def _align(self, offset: int) -> int:
+        return -(-offset // self.ALIGNMENT) * self.ALIGNMENT
+
+    def __repr__(self) -> str:
+        return (
+            f"ResourceBundle(entries: {len(self._index)}, hits: {self.hits}, misses: {self.misses})"
+        )
+
+
+def _hash_files(paths: Sequence[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode())
+        digest.update(b"\0")
+        with open(path, "rb") as source_file:
+            for chunk in iter(lambda: source_file.read(2**20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
@@ -1,51 +1,89 @@
-import socket, threading
+import json, socket, threading, time
 
 import marshmallow
 
 from edgin_around_api import actions, defs
 from . import motives, thruster, utils
 
-from typing import List, Optional
+from typing import Callable, List, Optional, TextIO
+
+
+def process_message(message: str, thruster: thruster.Thruster) -> None:
+    """Converts the message to a `Motive` and passes it to the `Thruster`."""
+
+    action = actions.action_from_json_string(message)
+    if action is None:
+        return
+
+    motive = motives.motive_from_action(action)
+    if motive is None:
+        return
+
+    thruster.add(motive)
+
+
+class MessageRecorder:
+    """
+    Writes received messages to a file, one JSON object per line with the message and the time in
+    seconds since the recording started. Recordings can be replayed by the benchmark.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file: TextIO = open(path, "w")
+        self._start = time.monotonic()
+
+    def record(self, message: str) -> None:
+        entry = {"time": time.monotonic() - self._start, "message": message}
+        self._file.write(json.dumps(entry) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
 
 
 class ConnectorThread(threading.Thread):
     """Thread for handling messages coming from the server."""
 
     def __init__(
-        self, sock: socket.socket, event: threading.Event, thruster: thruster.Thruster
+        self,
+        sock: socket.socket,
+        event: threading.Event,
+        thruster: thruster.Thruster,
+        wake: Callable[[], None],
+        recorder: Optional[MessageRecorder] = None,
     ) -> None:
         super().__init__()
         self._sock = sock
         self._event = event
         self._thruster = thruster
+        self._wake = wake
+        self._recorder = recorder
         self._processor = utils.SocketProcessor()
 
     def run(self) -> None:
         while self._event.is_set():
             messages = self._processor.read_messages(self._sock)
             for message in messages:
-                self._process_message(message)
-
-    def _process_message(self, message: str) -> None:
-        """Converts the message to an `Animation` and passes it to the `Animator`."""
-
-        action = actions.action_from_json_string(message)
-        if action is None:
-            return
-
-        motive = motives.motive_from_action(action)
-        if motive is None:
-            return
-
-        self._thruster.add(motive)
+                if self._recorder is not None:
+                    self._recorder.record(message)
+                process_message(message, self._thruster)
+            if len(messages) > 0:
+                self._wake()
 
 
 class Connector:
     """Prepares and manages the thread handling messages from the server."""
 
-    def __init__(self, thruster: thruster.Thruster) -> None:
+    def __init__(
+        self,
+        thruster: thruster.Thruster,
+        wake: Callable[[], None],
+        record_path: Optional[str] = None,
+    ) -> None:
         self._event = threading.Event()
         self._thruster = thruster
+        self._wake = wake
+        self._record_path = record_path
+        self._recorder: Optional[MessageRecorder] = None
         self._thread: Optional[ConnectorThread] = None
 
     def start(self, address: str) -> socket.socket:
@@ -57,7 +95,12 @@ class Connector:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.connect((address, defs.PORT_DATA))
 
-        self._thread = ConnectorThread(sock, self._event, self._thruster)
+        if self._record_path is not None:
+            self._recorder = MessageRecorder(self._record_path)
+
+        self._thread = ConnectorThread(
+            sock, self._event, self._thruster, self._wake, self._recorder
+        )
 
         self._event.set()
         self._thread.start()
@@ -70,3 +113,6 @@ class Connector:
         self._event.clear()
         if self._thread is not None:
             self._thread.join()
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
@@ -124,6 +124,11 @@ class Controls:
         elif key in self.repeatable_actions:
             del self.active_actions[key]
 
+    def is_active(self) -> bool:
+        """Tells if any key with an action performed on every frame is being held."""
+
+        return len(self.active_actions) > 0 or self.current_action is not None
+
     def handle_draw(self) -> bool:
         current_moment = time.monotonic()
         if self.prev_moment is not None:
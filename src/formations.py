@@ -1,5 +1,7 @@
 import math, numbers
 
+import numpy
+
 from enum import Enum
 
 from typing import List, Optional, Tuple, Union
@@ -69,6 +71,12 @@ class Color:
         return f"Color({self.r}, {self.g}, {self.b}, {self.a})"
 
 
+# Rectangle in texture coordinates (u1, v1, u2, v2). `v1` corresponds to the top of an image.
+UvRect = Tuple[float, float, float, float]
+
+FULL_UV: UvRect = (0.0, 0.0, 1.0, 1.0)
+
+
 class Plain:
     def __init__(
         self,
@@ -77,29 +85,105 @@ class Plain:
         position: Position,
         size: Size,
         flip_vertical: bool = False,
+        uv: UvRect = FULL_UV,
     ) -> None:
         self.texture_id = texture_id
         self.color = color
         self.position = position
         self.size = size
         self.flip_vertical = flip_vertical
+        self.uv = uv
 
     def __repr__(self) -> str:
-        return "Plain(texture_id: {}, color: {}, position: {}, size: {}, flip_vertical: {})".format(
-            self.texture_id, self.color, str(self.position), str(self.size), self.flip_vertical
+        return (
+            "Plain(texture_id: {}, color: {}, position: {}, size: {}, flip_vertical: {}, uv: {})"
+        ).format(
+            self.texture_id,
+            self.color,
+            str(self.position),
+            str(self.size),
+            self.flip_vertical,
+            self.uv,
         )
 
 
+# Layout of a plain in the array form produced by `Formation.prepare_plain_array`. Plains without
+# a color have it zeroed out and plains without a texture have texture ID 0.
+PLAIN_DTYPE = numpy.dtype(
+    [
+        ("position", numpy.float32, 2),
+        ("size", numpy.float32, 2),
+        ("color", numpy.float32, 4),
+        ("uv", numpy.float32, 4),
+        ("flip", numpy.bool_),
+        ("texture", numpy.uint32),
+    ]
+)
+
+# The same memory layout as `PLAIN_DTYPE` but with flat fields. NumPy converts flat tuples to
+# arrays much faster than nested ones, so records are built in this form and then reinterpreted.
+_PLAIN_RECORD_DTYPE = numpy.dtype(
+    [
+        (name, numpy.float32)
+        for name in ("x", "y", "width", "height", "r", "g", "b", "a", "u1", "v1", "u2", "v2")
+    ]
+    + [("flip", numpy.bool_), ("texture", numpy.uint32)]
+)
+
+# fmt: off
+PlainRecord = Tuple[
+    float, float, float, float, float, float, float, float, float, float, float, float, bool, int
+]
+# fmt: on
+
+_NO_COLOR = (0.0, 0.0, 0.0, 0.0)
+
+
+def make_plain_record(
+    texture_id: Optional[int],
+    color: Optional[Color],
+    x: float,
+    y: float,
+    size: Size,
+    flip_vertical: bool = False,
+    uv: UvRect = FULL_UV,
+) -> PlainRecord:
+    r, g, b, a = color.to_float_tuple() if color is not None else _NO_COLOR
+    u1, v1, u2, v2 = uv
+    texture = texture_id if texture_id is not None else 0
+    return (x, y, size.width, size.height, r, g, b, a, u1, v1, u2, v2, flip_vertical, texture)
+
+
+def records_to_array(records: List[PlainRecord]) -> numpy.ndarray:
+    """Converts plain records to the array form described by `PLAIN_DTYPE`."""
+
+    return numpy.array(records, dtype=_PLAIN_RECORD_DTYPE).view(PLAIN_DTYPE)
+
+
+def plains_to_array(plains: List[Plain]) -> numpy.ndarray:
+    """Converts a list of `Plain` objects to the array form described by `PLAIN_DTYPE`."""
+
+    records = [
+        make_plain_record(
+            p.texture_id, p.color, p.position.x, p.position.y, p.size, p.flip_vertical, p.uv
+        )
+        for p in plains
+    ]
+    return records_to_array(records)
+
+
 class Content:
     def __init__(
         self,
         size: Size,
         texture_id: Optional[int] = None,
         color: Optional[Color] = None,
+        uv: UvRect = FULL_UV,
     ) -> None:
         self._texture_id = texture_id
         self._color = color
         self._size = size
+        self._uv = uv
 
     def has_proper_size(self) -> bool:
         return (not math.isclose(self._size.width, 0.0)) and (
@@ -121,12 +205,15 @@ class Content:
     def get_color(self) -> Optional[Color]:
         return self._color
 
+    def get_uv(self) -> UvRect:
+        return self._uv
+
     def _set_size(self, size: Size) -> None:
         self._size = size
 
     def __repr__(self) -> str:
-        return "Content(size: {}, texture: {}, color: {})".format(
-            self._size, self._texture_id, self._color
+        return "Content(size: {}, texture: {}, color: {}, uv: {})".format(
+            self._size, self._texture_id, self._color, self._uv
         )
 
 
@@ -154,7 +241,9 @@ class Formation:
         return self._is_visible
 
     def set_content(self, content: Optional[Content]) -> None:
+        # Contents may keep the texture ID while changing the texture, so always update.
         self._content = content
+        self._needs_update = True
 
     def set_position(self, position: Position) -> None:
         self._position = position
@@ -164,7 +253,15 @@ class Formation:
         if is_visible:
             self._needs_reallocation = True
 
+    def dispose(self) -> None:
+        """Gives back GPU resources of the formation and its children, which are not used anymore."""
+
+        for child in self._children:
+            child.dispose()
+
     def clear(self) -> None:
+        for child in self._children:
+            child.dispose()
         self._children = list()
         self.mark_as_needs_reallocation()
 
@@ -239,6 +336,16 @@ class Formation:
         if self.needs_reallocation():
             self.reallocate()
 
+    def refresh_contents(self) -> None:
+        """
+        Recreates contents which got outdated by resizing. Formations producing contents which are
+        expensive to recreate (like labels) only mark them as outdated when resized and wait for
+        this call, so repeated resizes can be handled cheaply.
+        """
+
+        for child in self._children:
+            child.refresh_contents()
+
     def prepare_plains(self, parent_position=Position(0.0, 0.0)) -> List[Plain]:
         abs_position = self._position + parent_position
         result = list()
@@ -252,6 +359,7 @@ class Formation:
                         abs_position,
                         self._size,
                         self._flip_vertical,
+                        self._content._uv,
                     )
                 )
 
@@ -261,6 +369,38 @@ class Formation:
         self._needs_update = False
         return result
 
+    def prepare_plain_array(self) -> numpy.ndarray:
+        """
+        Works like `prepare_plains` but returns the plains as a structured array described by
+        `PLAIN_DTYPE` without creating intermediate `Plain` objects.
+        """
+
+        records: List[PlainRecord] = list()
+        self.collect_plain_records(0.0, 0.0, records)
+        return records_to_array(records)
+
+    def collect_plain_records(self, x: float, y: float, records: List[PlainRecord]) -> None:
+        x, y = x + self._position.x, y + self._position.y
+
+        if self._is_visible:
+            if (self._content is not None) and (self._content.is_displayable()):
+                records.append(
+                    make_plain_record(
+                        self._content._texture_id,
+                        self._content._color,
+                        x,
+                        y,
+                        self._size,
+                        self._flip_vertical,
+                        self._content._uv,
+                    )
+                )
+
+            for child in self._children:
+                child.collect_plain_records(x, y, records)
+
+        self._needs_update = False
+
     def contains(self, position: Position) -> bool:
         x1, x2 = 0.0, self._size.width
         y1, y2 = 0.0, self._size.height
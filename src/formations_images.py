@@ -1,54 +1,186 @@
-import ctypes
-import numpy
-import tinyarray
+import collections, ctypes
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from OpenGL import GL
 
-from typing import List
+from typing import Dict, Hashable, List, Optional
 
-from . import formations
+from . import formations, gpu_resources, graphics, text
 
 
 class ImageFileContent(formations.Content):
     def __init__(self, filename: str) -> None:
-        image = Image.open(filename)
-        data = numpy.array(list(image.getdata()), numpy.uint8)
-        image.close()
-
         texture_id = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-        GL.glTexImage2D(
-            GL.GL_TEXTURE_2D,
-            0,
-            GL.GL_RGBA,
-            image.size[0],
-            image.size[1],
-            0,
-            GL.GL_RGBA,
-            GL.GL_UNSIGNED_BYTE,
-            data,
-        )
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, texture_id, "images")
+        with Image.open(filename) as image:
+            graphics.upload_image(texture_id, image)
+            size = formations.Size(image.size[0], image.size[1])
 
-        super().__init__(formations.Size(image.size[0], image.size[1]), texture_id)
-
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        super().__init__(size, texture_id)
 
 
 class ImageFormation(formations.Formation):
-    def __init__(self, size: formations.Size, texture_id: int) -> None:
+    def __init__(
+        self, size: formations.Size, texture_id: int, uv: formations.UvRect = formations.FULL_UV
+    ) -> None:
         super().__init__()
-        self.set_image(size, texture_id)
+        self.set_image(size, texture_id, uv)
 
-    def set_image(self, size: formations.Size, texture_id: int) -> None:
-        content = formations.Content(size, texture_id)
+    def set_image(
+        self, size: formations.Size, texture_id: int, uv: formations.UvRect = formations.FULL_UV
+    ) -> None:
+        content = formations.Content(size, texture_id, uv=uv)
         self.set_content(content)
 
 
+class CachedTexture:
+    """
+    One reference to a texture of `LabelTextureCache`. The reference is given back when this object
+    is dropped; the texture itself is deleted later, on the thread using the cache.
+    """
+
+    def __init__(self, cache: "LabelTextureCache", key: Hashable, texture_id: int) -> None:
+        self.key = key
+        self.texture_id = texture_id
+        self._cache = cache
+
+    def __del__(self) -> None:
+        self._cache._release_later(self.key)
+
+
+class _CacheEntry:
+    def __init__(self, texture_id: int, size: int) -> None:
+        self.texture_id = texture_id
+        self.size = size
+        self.references = 1
+
+
+class LabelTextureCache:
+    """
+    Textures of rasterized labels, shared by all labels which would produce the same pixels.
+
+    Textures are reference counted. Textures no label uses anymore are kept for reuse and deleted,
+    least recently used first, once all cached textures take more than `budget` bytes. Textures in
+    use are never deleted, so the budget may be exceeded while they are needed.
+    """
+
+    BUDGET = 16 * 2**20
+
+    def __init__(self, budget: int = BUDGET) -> None:
+        self._budget = budget
+        self._entries: Dict[Hashable, _CacheEntry] = dict()
+        self._unused: "collections.OrderedDict[Hashable, None]" = collections.OrderedDict()
+        self._released: List[Hashable] = list()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, key: Hashable) -> Optional[CachedTexture]:
+        """Returns a new reference to the texture stored under `key`, if there is one."""
+
+        self._process_releases()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry.references += 1
+        self._unused.pop(key, None)
+        return CachedTexture(self, key, entry.texture_id)
+
+    def insert(self, key: Hashable, texture_id: int, size: int) -> CachedTexture:
+        """Takes over the texture of the given size in bytes and returns the first reference to it."""
+
+        assert key not in self._entries, "Label texture cached twice"
+        self._entries[key] = _CacheEntry(texture_id, size)
+        self._size += size
+        self._trim()
+        return CachedTexture(self, key, texture_id)
+
+    def evict(self, size: int) -> int:
+        """
+        Deletes unused textures, least recently used first, until `size` bytes are freed or none
+        are left. Returns the number of bytes freed.
+        """
+
+        self._process_releases()
+        freed = 0
+        while freed < size and len(self._unused) > 0:
+            freed += self._evict_oldest()
+        return freed
+
+    def get_stats(self) -> Dict[str, int]:
+        self._process_releases()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "textures": len(self._entries),
+            "unused": len(self._unused),
+            "bytes": self._size,
+        }
+
+    def _release_later(self, key: Hashable) -> None:
+        # May be called by the garbage collector on any thread, so only queue the key here.
+        self._released.append(key)
+
+    def _process_releases(self) -> None:
+        while len(self._released) > 0:
+            key = self._released.pop()
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            entry.references -= 1
+            if entry.references == 0:
+                self._unused[key] = None
+        self._trim()
+
+    def _trim(self) -> None:
+        while self._size > self._budget and len(self._unused) > 0:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> int:
+        key, _ = self._unused.popitem(last=False)
+        entry = self._entries.pop(key)
+        graphics.delete_texture(entry.texture_id)
+        self._size -= entry.size
+        self.evictions += 1
+        return entry.size
+
+    def __repr__(self) -> str:
+        return (
+            f"LabelTextureCache(textures: {len(self._entries)}, bytes: {self._size}, "
+            f"hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions})"
+        )
+
+
 class Label(formations.Formation):
+    """
+    Single-line text. By default the text is rasterized with PIL into a texture, shared with other
+    labels of the same look through `TEXTURE_CACHE` if one is set. Once `use_text_engine` was
+    called, new labels instead emit one quad per glyph from a shared glyph atlas, so changing the
+    text costs no rasterization and no texture upload.
+    """
+
     FONT = "DejaVuSans.ttf"
+    FONTS = text.FONTS
+    TEXT_ENGINE: Optional[text.TextEngine] = None
+    TEXTURE_CACHE: Optional[LabelTextureCache] = None
+
+    @staticmethod
+    def use_text_engine(engine: Optional[text.TextEngine]) -> None:
+        """Selects the engine for labels created from now on (PIL rasterization if `None`)."""
+
+        Label.TEXT_ENGINE = engine
+
+    @staticmethod
+    def use_texture_cache(cache: Optional[LabelTextureCache]) -> None:
+        """Selects the cache for labels created from now on (own textures if `None`)."""
+
+        Label.TEXTURE_CACHE = cache
 
     def __init__(
         self,
@@ -67,9 +199,19 @@ class Label(formations.Formation):
         self._fg_color = fg_color
         self._bg_color = bg_color
         self._font_size = font_size
-        self._texture_id = GL.glGenTextures(1)
-        self._font = ImageFont.truetype(self.FONT, self._font_size)
+        self._font = self.FONTS.get_font(self.FONT, self._font_size)
         self._gravity = gravity
+        self._needs_recreation = False
+
+        self._atlas: Optional[text.GlyphAtlas] = None
+        self._glyph_records: List[formations.PlainRecord] = list()
+        self._cache = self.TEXTURE_CACHE
+        self._cached_texture: Optional[CachedTexture] = None
+        self._texture: Optional[gpu_resources.GpuHandle] = None
+        self._texture_id = 0
+        if self.TEXT_ENGINE is not None:
+            self._atlas = self.TEXT_ENGINE.get_atlas(self.FONT)
+
         self._recreate()
 
     def set_margin(self, margin: int) -> None:
@@ -98,10 +240,31 @@ class Label(formations.Formation):
     def resize(self, size: formations.Size) -> bool:
         resized = super().resize(size)
         if resized:
-            self._recreate()
+            # Rasterized in `refresh_contents`; until then the old texture gets stretched.
+            self._needs_recreation = True
         return resized
 
+    def refresh_contents(self) -> None:
+        if self._needs_recreation:
+            self._recreate()
+        super().refresh_contents()
+
+    def dispose(self) -> None:
+        # The texture is given back right away instead of whenever the label gets collected.
+        super().dispose()
+        if self._texture is not None:
+            self._texture.release()
+            self._texture = None
+        self._cached_texture = None
+        self._texture_id = 0
+        self.set_content(None)
+
     def _recreate(self) -> None:
+        self._needs_recreation = False
+        if self._atlas is not None:
+            self._layout_glyphs(self._atlas)
+            return
+
         size = self.get_size()
         outer_width, outer_height = int(size.width), int(size.height)
         inner_width = int(size.width - 2 * self._margin)
@@ -110,10 +273,49 @@ class Label(formations.Formation):
         if inner_width < 1 or inner_height < 1:
             return
 
+        if self._cache is not None:
+            self._acquire_texture(self._cache, inner_width, inner_height)
+        else:
+            if self._texture is None:
+                self._texture = gpu_resources.RESOURCES.create_texture("labels")
+                self._texture_id = self._texture.texture_id
+            self._rasterize(self._texture_id, inner_width, inner_height)
+        self.set_content(formations.Content(size, self._texture_id))
+
+    def _acquire_texture(self, cache: LabelTextureCache, width: int, height: int) -> None:
+        bg_color = self._bg_color.to_256_tuple()
+        fg_color = self._fg_color.to_256_tuple()
+        key = (
+            self._text,
+            self.FONT,
+            self._font_size,
+            fg_color,
+            bg_color,
+            self._padding,
+            self._gravity,
+            width,
+            height,
+        )
+
+        if self._cached_texture is not None and self._cached_texture.key == key:
+            return
+
+        cached_texture = cache.acquire(key)
+        if cached_texture is None:
+            texture_id = GL.glGenTextures(1)
+            gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, texture_id, "label cache")
+            self._rasterize(texture_id, width, height)
+            cached_texture = cache.insert(key, texture_id, 4 * width * height)
+
+        # Dropping the previous reference gives it back to the cache.
+        self._cached_texture = cached_texture
+        self._texture_id = cached_texture.texture_id
+
+    def _rasterize(self, texture_id: int, inner_width: int, inner_height: int) -> None:
         bg_color = self._bg_color.to_256_tuple()
         fg_color = self._fg_color.to_256_tuple()
 
-        text_width, text_height = self._font.getsize(self._text)
+        text_width, text_height = self._font.get_size(self._text)
         if self._gravity == formations.Gravity.START:
             position = self._padding
         elif self._gravity == formations.Gravity.CENTER:
@@ -123,47 +325,106 @@ class Label(formations.Formation):
 
         image = Image.new("RGBA", (inner_width, inner_height), bg_color)
         draw = ImageDraw.Draw(image)
-        draw.text((position, self._padding), self._text, fill=fg_color, font=self._font)
-
-        # NOTE: Converting image data to numpy array has bad performance. `tinyarray` used here
-        # seems to improve the performance.
-        # TODO: Maybe move text rendering to `edgin_around_rendering`?
-        data1 = image.getdata()
-        data2 = tinyarray.array(data1)
-        data3 = numpy.array(data2)
-
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_id)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-        GL.glTexImage2D(
-            GL.GL_TEXTURE_2D,
-            0,
-            GL.GL_RGBA,
-            inner_width,
-            inner_height,
-            0,
-            GL.GL_RGBA,
-            GL.GL_UNSIGNED_BYTE,
-            data3,
-        )
+        draw.text((position, self._padding), self._text, fill=fg_color, font=self._font.image_font)
 
-        self.set_content(formations.Content(size, self._texture_id))
+        graphics.upload_image(texture_id, image)
+
+    def _layout_glyphs(self, atlas: text.GlyphAtlas) -> None:
+        self._glyph_records = list()
+        self.mark_as_needs_update()
+
+        size = self.get_size()
+        inner_width = size.width - 2 * self._margin
+        inner_height = size.height - 2 * self._margin
+        if inner_width < 1 or inner_height < 1:
+            return
+
+        if self._bg_color.a > 0.0:
+            inner_size = formations.Size(inner_width, inner_height)
+            record = formations.make_plain_record(
+                None, self._bg_color, self._margin, self._margin, inner_size
+            )
+            self._glyph_records.append(record)
+
+        text_width = atlas.measure(self._text, self._font_size)
+        if self._gravity == formations.Gravity.START:
+            position = self._padding
+        elif self._gravity == formations.Gravity.CENTER:
+            position = 0.5 * (inner_width - text_width)
+        elif self._gravity == formations.Gravity.END:
+            position = inner_width - text_width
+
+        # Negative alpha tells the shader to read the texture as a distance field.
+        r, g, b, a = self._fg_color.to_float_tuple()
+        if a <= 0.0:
+            return
+
+        top = self._margin + inner_height - self._padding
+        texture = atlas.get_texture_id()
+        quads = atlas.layout(self._text, self._font_size, self._margin + position, top)
+        for x, y, width, height, (u1, v1, u2, v2) in quads:
+            record = (x, y, width, height, r, g, b, -a, u1, v1, u2, v2, False, texture)
+            self._glyph_records.append(record)
+
+    def _measure_text(self, text: str) -> float:
+        if self._atlas is not None:
+            return self._atlas.measure(text, self._font_size)
+        text_width, text_height = self._font.get_size(text)
+        return text_width
+
+    def _get_line_height(self) -> float:
+        if self._atlas is not None:
+            return self._atlas.get_line_height(self._font_size)
+        return self._font.get_line_height()
 
     def calc_pref_width(self, height: float) -> float:
-        text_width, text_height = self._font.getsize(self._text)
-        return text_width + 2 * (self._margin + self._padding)
+        return self._measure_text(self._text) + 2 * (self._margin + self._padding)
 
     def calc_pref_height(self, width: float) -> float:
-        asscent, descent = self._font.getmetrics()
-        return asscent + descent + 2 * (self._margin + self._padding)
+        return self._get_line_height() + 2 * (self._margin + self._padding)
 
     def prepare_plains(
         self,
         parent_position=formations.Position(0.0, 0.0),
     ) -> List[formations.Plain]:
         self._needs_update = False
+        if self._atlas is not None:
+            position = parent_position + self._position
+            return [
+                formations.Plain(
+                    texture or None,
+                    formations.Color(r, g, b, a),
+                    formations.Position(position.x + x, position.y + y),
+                    formations.Size(width, height),
+                    flip,
+                    (u1, v1, u2, v2),
+                )
+                for x, y, width, height, r, g, b, a, u1, v1, u2, v2, flip, texture in (
+                    self._glyph_records
+                )
+            ]
+
         margin_size = 2 * self._margin
         margin_offset = formations.Position(self._margin, self._margin)
         position = parent_position + self._position + margin_offset
         size = formations.Size(self._size.width - margin_size, self._size.height - margin_size)
         return [formations.Plain(self._texture_id, None, position, size)]
+
+    def collect_plain_records(
+        self,
+        x: float,
+        y: float,
+        records: List[formations.PlainRecord],
+    ) -> None:
+        self._needs_update = False
+        if self._atlas is not None:
+            x, y = x + self._position.x, y + self._position.y
+            for record in self._glyph_records:
+                records.append((x + record[0], y + record[1]) + record[2:])  # type: ignore
+            return
+
+        margin_size = 2 * self._margin
+        x = x + self._position.x + self._margin
+        y = y + self._position.y + self._margin
+        size = formations.Size(self._size.width - margin_size, self._size.height - margin_size)
+        records.append(formations.make_plain_record(self._texture_id, None, x, y, size))
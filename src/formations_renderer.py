@@ -2,129 +2,466 @@ import ctypes
 import numpy
 
 from OpenGL import GL
-from OpenGL.GL import shaders
 
-from typing import Final, List, Optional, Tuple
+from typing import Dict, Final, List, Optional, Tuple, Union
 
-from . import geometry, formations
+from . import geometry, glfast, glstate, formations, gpu_resources, graphics, programs
 
+_QUAD_INDICES = numpy.array([0, 1, 2, 2, 3, 0], dtype=numpy.uint32)
+_PLAIN_DEPTH = 0.5
+_TRANSPARENT = numpy.zeros(4, dtype=numpy.float32)
+
+# Blend functions (source and destination for colors, then for alpha) for straight-alpha plains drawn
+# over opaque content, for plains composed into a transparent offscreen target (the alpha channel
+# accumulates coverage, so the target ends up holding premultiplied colors) and for drawing such
+# premultiplied targets.
+BLEND_STRAIGHT = (
+    GL.GL_SRC_ALPHA,
+    GL.GL_ONE_MINUS_SRC_ALPHA,
+    GL.GL_SRC_ALPHA,
+    GL.GL_ONE_MINUS_SRC_ALPHA,
+)
+BLEND_COMPOSE = (GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA, GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA)
+BLEND_PREMULTIPLIED = (GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA, GL.GL_ONE, GL.GL_ONE_MINUS_SRC_ALPHA)
+
+# Above this number of plains the batching does not try to reorder plains and only merges
+# consecutive plains sharing a texture. Reordering needs a square overlap matrix.
+REORDER_LIMIT = 2048
+
+
+class Batch:
+    """A range of consecutive plains drawn with a single draw call."""
+
+    def __init__(self, texture_id: int, first: int, count: int) -> None:
+        self.texture_id = texture_id
+        self.first = first
+        self.count = count
+
+    def __repr__(self) -> str:
+        return f"Batch(texture_id: {self.texture_id}, first: {self.first}, count: {self.count})"
+
+
+class RenderStats:
+    """Counts draw calls and texture binds issued while rendering a frame."""
 
-class PlainRenderer:
     def __init__(self) -> None:
-        self._plains: List[formations.Plain] = list()
+        self.draw_calls = 0
+        self.texture_binds = 0
+
+    def reset(self) -> None:
+        self.draw_calls = 0
+        self.texture_binds = 0
+
+    def add(self, other: "RenderStats") -> None:
+        self.draw_calls += other.draw_calls
+        self.texture_binds += other.texture_binds
+
+    def __repr__(self) -> str:
+        return f"RenderStats(draw_calls: {self.draw_calls}, texture_binds: {self.texture_binds})"
+
+
+def batch_plains(
+    plains: numpy.ndarray,
+    reorder_limit: int = REORDER_LIMIT,
+) -> Tuple[numpy.ndarray, List[Batch]]:
+    """
+    Groups plains by texture. Returns the order in which the plains should be placed in the vertex
+    buffer and the list of batches referring to ranges in that order.
+
+    A plain may be moved to an earlier batch with the same texture only if it does not overlap any
+    plain drawn between that batch and its original place, so the result of blending stays the same.
+    Plains without a texture (texture ID 0) do not care which texture is bound and may join any
+    batch.
+    """
+
+    textures = plains["texture"]
+    num_plains = len(plains)
+
+    if num_plains > reorder_limit:
+        order = numpy.arange(num_plains)
+        assignment = _merge_runs(textures)
+    else:
+        assignment = _assign_batches(plains)
+        order = numpy.argsort(assignment, kind="stable")
+
+    sorted_assignment = assignment[order]
+    sorted_textures = textures[order]
+    starts = numpy.flatnonzero(numpy.diff(sorted_assignment, prepend=-1))
+    counts = numpy.diff(starts, append=num_plains)
+
+    batches = list()
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        batch_textures = sorted_textures[start : start + count]
+        textured = batch_textures[batch_textures != 0]
+        texture_id = int(textured[0]) if len(textured) > 0 else 0
+        batches.append(Batch(texture_id, start, count))
+
+    return order, batches
+
+
+def _merge_runs(textures: numpy.ndarray) -> numpy.ndarray:
+    assignment = numpy.empty(len(textures), dtype=numpy.int64)
+    current_batch, current_texture = -1, 0
+    for i, texture_id in enumerate(textures.tolist()):
+        if current_batch < 0 or (texture_id != 0 and current_texture not in (0, texture_id)):
+            current_batch += 1
+            current_texture = texture_id
+        elif texture_id != 0:
+            current_texture = texture_id
+        assignment[i] = current_batch
+    return assignment
+
+
+def _assign_batches(plains: numpy.ndarray) -> numpy.ndarray:
+    x1, y1 = plains["position"][:, 0], plains["position"][:, 1]
+    x2, y2 = x1 + plains["size"][:, 0], y1 + plains["size"][:, 1]
+    overlaps = (
+        (x1[:, numpy.newaxis] < x2[numpy.newaxis, :])
+        & (x1[numpy.newaxis, :] < x2[:, numpy.newaxis])
+        & (y1[:, numpy.newaxis] < y2[numpy.newaxis, :])
+        & (y1[numpy.newaxis, :] < y2[:, numpy.newaxis])
+    )
+
+    assignment = numpy.empty(len(plains), dtype=numpy.int64)
+    batch_textures: List[int] = list()
+    latest_batch_with_texture: Dict[int, int] = dict()
+
+    for i, texture_id in enumerate(plains["texture"].tolist()):
+        # Batch of the most recently drawn plain overlapping this one. This plain must not be drawn
+        # before it.
+        overlapping = assignment[:i][overlaps[i, :i]]
+        bound = int(overlapping.max()) if len(overlapping) > 0 else 0
+
+        if texture_id == 0:
+            candidate = len(batch_textures) - 1
+        else:
+            candidate = max(
+                latest_batch_with_texture.get(texture_id, -1),
+                latest_batch_with_texture.get(0, -1),
+            )
+
+        if candidate >= 0 and candidate >= bound:
+            if batch_textures[candidate] == 0 and texture_id != 0:
+                batch_textures[candidate] = texture_id
+                del latest_batch_with_texture[0]
+                latest_batch_with_texture[texture_id] = candidate
+            assignment[i] = candidate
+        else:
+            assignment[i] = len(batch_textures)
+            latest_batch_with_texture[texture_id] = len(batch_textures)
+            batch_textures.append(texture_id)
+
+    return assignment
+
+
+def prepare_vertices(plains: numpy.ndarray) -> numpy.ndarray:
+    """
+    Generates vertex data (position, color and texture coordinates for each of the four corners:
+    bottom-left, top-left, top-right and bottom-right) for plains given as an array described by
+    `formations.PLAIN_DTYPE`.
+    """
+
+    vertices = numpy.empty((len(plains), 4, 3 + 4 + 2), dtype=numpy.float32)
+
+    x1, y1 = plains["position"][:, 0], plains["position"][:, 1]
+    x2, y2 = x1 + plains["size"][:, 0], y1 + plains["size"][:, 1]
+
+    vertices[:, 0, 0], vertices[:, 0, 1] = x1, y1
+    vertices[:, 1, 0], vertices[:, 1, 1] = x1, y2
+    vertices[:, 2, 0], vertices[:, 2, 1] = x2, y2
+    vertices[:, 3, 0], vertices[:, 3, 1] = x2, y1
+    vertices[:, :, 2] = _PLAIN_DEPTH
+    vertices[:, :, 3:7] = plains["color"][:, numpy.newaxis, :]
+
+    u1, v1, u2, v2 = (plains["uv"][:, i] for i in range(4))
+    v_bottom = numpy.where(plains["flip"], v1, v2)
+    v_top = numpy.where(plains["flip"], v2, v1)
+    vertices[:, 0, 7], vertices[:, 0, 8] = u1, v_bottom
+    vertices[:, 1, 7], vertices[:, 1, 8] = u1, v_top
+    vertices[:, 2, 7], vertices[:, 2, 8] = u2, v_top
+    vertices[:, 3, 7], vertices[:, 3, 8] = u2, v_bottom
+
+    return vertices.ravel()
+
+
+def upload_buffer(target: int, data: numpy.ndarray, capacity: int, usage: int) -> int:
+    """
+    Uploads data to the buffer bound to `target`, reusing its storage if `capacity` (in bytes)
+    suffices and growing it otherwise. Returns the new capacity.
+    """
+
+    if data.nbytes > capacity:
+        capacity = max(data.nbytes, 2 * capacity)
+        glfast.glBufferData(target, capacity, None, usage)
+
+    if data.nbytes > 0:
+        glfast.glBufferSubData(target, 0, data.nbytes, data)
+
+    return capacity
+
+
+def prepare_indices(num_plains: int) -> numpy.ndarray:
+    """Generates indices for drawing `num_plains` plains as pairs of triangles."""
+
+    offsets = 4 * numpy.arange(num_plains, dtype=numpy.uint32)
+    return (offsets[:, numpy.newaxis] + _QUAD_INDICES).ravel()
+
+
+class PlainRenderer:
+    def __init__(self, state: glstate.GlState, stats: Optional[RenderStats] = None) -> None:
+        self._plains = numpy.empty(0, dtype=formations.PLAIN_DTYPE)
+        self._batches: List[Batch] = list()
+        self._state = state
+        self._stats = stats if stats is not None else RenderStats()
 
         self._vao = GL.glGenVertexArrays(1)
         self._vbo = GL.glGenBuffers(1)
         self._ibo = GL.glGenBuffers(1)
+        gpu_resources.RESOURCES.track(gpu_resources.BUFFER, self._vbo, "vertex buffers")
+        gpu_resources.RESOURCES.track(gpu_resources.BUFFER, self._ibo, "vertex buffers")
+        self._vertex_capacity = 0
+        self._index_capacity = 0
 
         self._bind()
         self._load_vertices()
         self._load_indices()
-        self._unbind()
+
+        # The vertex array object remembers the attribute layout, so it is set up only once.
+        stride: Final[int] = 4 * (3 + 4 + 2)
+
+        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(0))
+        GL.glEnableVertexAttribArray(0)
+
+        GL.glVertexAttribPointer(1, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(12))
+        GL.glEnableVertexAttribArray(1)
+
+        GL.glVertexAttribPointer(2, 2, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(28))
+        GL.glEnableVertexAttribArray(2)
 
     def __del__(self) -> None:
-        GL.glDeleteBuffers(2, [self._vbo, self._ibo])
+        self._state.delete_buffers([self._vbo, self._ibo])
 
-    def set_plains(self, plains: List[formations.Plain]) -> None:
-        self._plains = plains
+    def set_plains(self, plains: Union[List[formations.Plain], numpy.ndarray]) -> None:
+        if isinstance(plains, list):
+            plains = formations.plains_to_array(plains)
+
+        order, self._batches = batch_plains(plains)
+        self._plains = plains[order]
 
         self._bind()
         self._load_vertices()
         self._load_indices()
-        self._unbind()
 
     def render(self) -> None:
         count: Final[int] = 6
-        stride: Final[int] = 4 * (3 + 4 + 2)
 
-        self._bind()
+        self._state.bind_vertex_array(self._vao)
 
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(0))
-        GL.glEnableVertexAttribArray(0)
+        bound_texture_id = 0
+        for batch in self._batches:
+            if batch.texture_id not in (0, bound_texture_id):
+                self._state.bind_texture(GL.GL_TEXTURE_2D, batch.texture_id)
+                bound_texture_id = batch.texture_id
+                self._stats.texture_binds += 1
 
-        GL.glVertexAttribPointer(1, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(12))
-        GL.glEnableVertexAttribArray(1)
+            glfast.glDrawElements(
+                GL.GL_TRIANGLES,
+                count * batch.count,
+                GL.GL_UNSIGNED_INT,
+                ctypes.c_void_p(4 * count * batch.first),
+            )
+            self._stats.draw_calls += 1
 
-        GL.glVertexAttribPointer(2, 2, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(28))
-        GL.glEnableVertexAttribArray(2)
+    def _bind(self) -> None:
+        self._state.bind_vertex_array(self._vao)
+        self._state.bind_buffer(GL.GL_ARRAY_BUFFER, self._vbo)
+        self._state.bind_buffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._ibo)
 
-        for i, plain in enumerate(self._plains):
-            if plain.texture_id is not None:
-                GL.glBindTexture(GL.GL_TEXTURE_2D, plain.texture_id)
+    def _load_vertices(self) -> None:
+        vertices = prepare_vertices(self._plains)
+        self._vertex_capacity = upload_buffer(
+            GL.GL_ARRAY_BUFFER, vertices, self._vertex_capacity, GL.GL_DYNAMIC_DRAW
+        )
+        gpu_resources.RESOURCES.set_size(gpu_resources.BUFFER, self._vbo, self._vertex_capacity)
 
-            GL.glDrawElements(
-                GL.GL_TRIANGLES,
-                count,
-                GL.GL_UNSIGNED_INT,
-                ctypes.c_void_p(4 * count * i),
+    def _load_indices(self) -> None:
+        # Indices depend only on the number of plains and indices for fewer plains are a prefix of
+        # indices for more plains, so they are regenerated only when the buffer has to grow.
+        num_plains = len(self._plains)
+        if num_plains > self._index_capacity:
+            self._index_capacity = max(num_plains, 2 * self._index_capacity)
+            indices = prepare_indices(self._index_capacity)
+            glfast.glBufferData(
+                GL.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL.GL_STATIC_DRAW
             )
+            gpu_resources.RESOURCES.set_size(gpu_resources.BUFFER, self._ibo, indices.nbytes)
 
-        GL.glDisableVertexAttribArray(2)
-        GL.glDisableVertexAttribArray(1)
-        GL.glDisableVertexAttribArray(0)
 
-        self._unbind()
+# Per-instance data of the instanced renderer: position and size, texture rectangle (with `v1` and
+# `v2` swapped for flipped plains) and color as half floats, which keep the sign of the alpha marking
+# glyphs. 40 bytes per plain compared to 168 bytes of vertices and indices used by `PlainRenderer`.
+INSTANCE_DTYPE = numpy.dtype(
+    [
+        ("rect", numpy.float32, 4),
+        ("uv", numpy.float32, 4),
+        ("color", numpy.float16, 4),
+    ]
+)
 
-    def _bind(self) -> None:
-        GL.glBindVertexArray(self._vao)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self._vbo)
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+# Corners of the unit quad in the same order as vertices generated by `prepare_vertices`.
+_QUAD_CORNERS = numpy.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.0], dtype=numpy.float32)
 
-    def _unbind(self) -> None:
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, 0)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
-        GL.glBindVertexArray(0)
 
-    def _load_vertices(self) -> None:
-        vertices = self._prepare_vertices()
-        GL.glBufferData(GL.GL_ARRAY_BUFFER, 4 * len(vertices), vertices, GL.GL_DYNAMIC_DRAW)
+def prepare_instances(plains: numpy.ndarray) -> numpy.ndarray:
+    """
+    Generates per-instance data described by `INSTANCE_DTYPE` for plains given as an array described
+    by `formations.PLAIN_DTYPE`.
+    """
 
-    def _load_indices(self) -> None:
-        indices = self._prepare_indices()
-        GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, 4 * len(indices), indices, GL.GL_STATIC_DRAW)
-
-    def _prepare_vertices(self) -> numpy.ndarray:
-        DEFAULT_COLOR = (0.0, 0.0, 0.0, 0.0)
-
-        data = []
-        for i, plain in enumerate(self._plains):
-            z = 0.5
-            x1, x2 = plain.position.x, plain.position.x + plain.size.width
-            y1, y2 = plain.position.y, plain.position.y + plain.size.height
-            r, g, b, a = plain.color.to_float_tuple() if plain.color is not None else DEFAULT_COLOR
-
-            if plain.flip_vertical:
-                t11, t12, t21, t22, t31, t32, t41, t42 = 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.0
-            else:
-                t11, t12, t21, t22, t31, t32, t41, t42 = 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 1.0, 1.0
-
-            # fmt: off
-            data.append([
-                    x1, y1, z, r, g, b, a, t11, t12,
-                    x1, y2, z, r, g, b, a, t21, t22,
-                    x2, y2, z, r, g, b, a, t31, t32,
-                    x2, y1, z, r, g, b, a, t41, t42,
-                ])
-            # fmt: on
-
-        return numpy.array(data, dtype=numpy.float32).flatten()
-
-    def _prepare_indices(self) -> numpy.ndarray:
-        num_layers = len(self._plains)
-        return numpy.array(
-            [4 * num + offset for num in range(num_layers) for offset in (0, 1, 2, 2, 3, 0)],
-            dtype=numpy.uint32,
+    instances = numpy.empty(len(plains), dtype=INSTANCE_DTYPE)
+    instances["rect"][:, 0:2] = plains["position"]
+    instances["rect"][:, 2:4] = plains["size"]
+
+    uv = plains["uv"].copy()
+    uv[plains["flip"]] = uv[plains["flip"]][:, [0, 3, 2, 1]]
+    instances["uv"] = uv
+
+    # The fragment shader tells plains apart by the sign of the alpha, which half floats keep even
+    # for the smallest alpha values.
+    instances["color"] = numpy.clip(plains["color"], -1.0, 1.0)
+
+    return instances
+
+
+class InstancedPlainRenderer:
+    """
+    Renders plains as instances of a single static unit quad. Only the compact per-instance data
+    described by `INSTANCE_DTYPE` is generated on the CPU and uploaded when the plains change.
+    """
+
+    def __init__(self, state: glstate.GlState, stats: Optional[RenderStats] = None) -> None:
+        self._instances = numpy.empty(0, dtype=INSTANCE_DTYPE)
+        self._batches: List[Batch] = list()
+        self._state = state
+        self._stats = stats if stats is not None else RenderStats()
+        self._pointed_instance: Optional[int] = None
+        self._instance_capacity = 0
+
+        self._vao = GL.glGenVertexArrays(1)
+        self._quad_vbo = GL.glGenBuffers(1)
+        self._instance_vbo = GL.glGenBuffers(1)
+        self._ibo = GL.glGenBuffers(1)
+        for buffer in (self._quad_vbo, self._instance_vbo, self._ibo):
+            gpu_resources.RESOURCES.track(gpu_resources.BUFFER, buffer, "vertex buffers")
+        gpu_resources.RESOURCES.set_size(gpu_resources.BUFFER, self._quad_vbo, _QUAD_CORNERS.nbytes)
+        gpu_resources.RESOURCES.set_size(gpu_resources.BUFFER, self._ibo, _QUAD_INDICES.nbytes)
+
+        self._state.bind_vertex_array(self._vao)
+
+        self._state.bind_buffer(GL.GL_ARRAY_BUFFER, self._quad_vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, _QUAD_CORNERS.nbytes, _QUAD_CORNERS, GL.GL_STATIC_DRAW)
+        GL.glVertexAttribPointer(0, 2, GL.GL_FLOAT, GL.GL_FALSE, 0, ctypes.c_void_p(0))
+        GL.glEnableVertexAttribArray(0)
+
+        self._state.bind_buffer(GL.GL_ELEMENT_ARRAY_BUFFER, self._ibo)
+        GL.glBufferData(
+            GL.GL_ELEMENT_ARRAY_BUFFER, _QUAD_INDICES.nbytes, _QUAD_INDICES, GL.GL_STATIC_DRAW
+        )
+
+        for location in (1, 2, 3):
+            GL.glEnableVertexAttribArray(location)
+            GL.glVertexAttribDivisor(location, 1)
+
+    def __del__(self) -> None:
+        self._state.delete_buffers([self._quad_vbo, self._instance_vbo, self._ibo])
+
+    def set_plains(self, plains: Union[List[formations.Plain], numpy.ndarray]) -> None:
+        if isinstance(plains, list):
+            plains = formations.plains_to_array(plains)
+
+        order, self._batches = batch_plains(plains)
+        self._instances = prepare_instances(plains[order])
+
+        self._state.bind_buffer(GL.GL_ARRAY_BUFFER, self._instance_vbo)
+        self._instance_capacity = upload_buffer(
+            GL.GL_ARRAY_BUFFER, self._instances, self._instance_capacity, GL.GL_DYNAMIC_DRAW
+        )
+        gpu_resources.RESOURCES.set_size(
+            gpu_resources.BUFFER, self._instance_vbo, self._instance_capacity
+        )
+
+    def render(self) -> None:
+        self._state.bind_vertex_array(self._vao)
+
+        bound_texture_id = 0
+        for batch in self._batches:
+            if batch.texture_id not in (0, bound_texture_id):
+                self._state.bind_texture(GL.GL_TEXTURE_2D, batch.texture_id)
+                bound_texture_id = batch.texture_id
+                self._stats.texture_binds += 1
+
+            # OpenGL ES 3.0 has no base instance, so instance attributes are pointed at the batch.
+            self._point_instance_attributes(batch.first)
+            glfast.glDrawElementsInstanced(
+                GL.GL_TRIANGLES,
+                len(_QUAD_INDICES),
+                GL.GL_UNSIGNED_INT,
+                ctypes.c_void_p(0),
+                batch.count,
+            )
+            self._stats.draw_calls += 1
+
+    def _point_instance_attributes(self, first: int) -> None:
+        if self._pointed_instance == first:
+            return
+
+        stride = INSTANCE_DTYPE.itemsize
+        offset = stride * first
+        fields = INSTANCE_DTYPE.fields
+        assert fields is not None
+
+        self._state.bind_buffer(GL.GL_ARRAY_BUFFER, self._instance_vbo)
+        glfast.glVertexAttribPointer(
+            1, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(offset + fields["rect"][1])
+        )
+        glfast.glVertexAttribPointer(
+            2, 4, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(offset + fields["uv"][1])
         )
+        glfast.glVertexAttribPointer(
+            3,
+            4,
+            GL.GL_HALF_FLOAT,
+            GL.GL_FALSE,
+            stride,
+            ctypes.c_void_p(offset + fields["color"][1]),
+        )
+        self._pointed_instance = first
 
 
 class FormationGroup:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        instanced: bool = False,
+        state: Optional[glstate.GlState] = None,
+        blend: Tuple[int, int, int, int] = BLEND_STRAIGHT,
+        registry: Optional[programs.ProgramRegistry] = None,
+    ) -> None:
         self._size: Optional[formations.Size] = None
         self._initialized = False
-        self._renderer: Optional[PlainRenderer] = None
-        self._plains: Optional[List[formations.Plain]] = None
+        self._instanced = instanced
+        self._blend = blend
+        self._state = state if state is not None else glstate.GlState()
+        self._registry = registry if registry is not None else programs.ProgramRegistry()
+        self._renderer: Optional[Union[PlainRenderer, InstancedPlainRenderer]] = None
+        self._plains: Optional[Union[List[formations.Plain], numpy.ndarray]] = None
+        self._stats = RenderStats()
 
-    def set_plains(self, plains: List[formations.Plain]) -> None:
+    def get_stats(self) -> RenderStats:
+        """Returns draw call statistics of the most recent `render` call."""
+
+        return self._stats
+
+    def set_plains(self, plains: Union[List[formations.Plain], numpy.ndarray]) -> None:
         self._plains = plains
         if self._renderer is not None:
             self._renderer.set_plains(plains)
@@ -134,13 +471,14 @@ class FormationGroup:
         self._refresh_view()
 
     def render(self) -> None:
+        self._stats.reset()
+
         if not self._initialized:
             self._initialize()
 
         if self._is_ready():
             self._setup()
             self._draw()
-            self._teardown()
 
     def _is_ready(self) -> bool:
         return self._size is not None and self._renderer is not None
@@ -148,30 +486,20 @@ class FormationGroup:
     def _initialize(self) -> None:
         GL.glClearColor(0.5, 0.5, 0.5, 1)
 
-        self._program = self._load_program("formations")
+        if self._instanced:
+            self._program = self._registry.get("formations_instanced")
+            self._renderer = InstancedPlainRenderer(self._state, self._stats)
+        else:
+            self._program = self._registry.get("formations")
+            self._renderer = PlainRenderer(self._state, self._stats)
+
         self._loc_view = GL.glGetUniformLocation(self._program, "uniView")
 
-        self._renderer = PlainRenderer()
         if self._plains is not None:
             self._renderer.set_plains(self._plains)
 
         self._initialized = True
 
-    def _load_program(self, id: str) -> int:
-        file_template = "./shaders/{}_{}.glsl"
-
-        vertex_shader_file = open(file_template.format(id, "vertex"), "r")
-        vertex_shader_source = vertex_shader_file.read()
-        vertex_shader_file.close()
-
-        fragment_shader_file = open(file_template.format(id, "fragment"), "r")
-        fragment_shader_source = fragment_shader_file.read()
-        fragment_shader_file.close()
-
-        vertex_shader = shaders.compileShader(vertex_shader_source, GL.GL_VERTEX_SHADER)
-        fragment_shader = shaders.compileShader(fragment_shader_source, GL.GL_FRAGMENT_SHADER)
-        return shaders.compileProgram(vertex_shader, fragment_shader)
-
     def _refresh_view(self) -> None:
         assert self._size is not None
         left, right, bottom, top = 0, self._size.width, 0, self._size.height
@@ -180,21 +508,89 @@ class FormationGroup:
     def _setup(self) -> None:
         assert self._size is not None
 
-        GL.glEnable(GL.GL_TEXTURE_2D)
+        # Textures may have been bound directly while uploading, e.g. by labels.
+        self._state.invalidate_textures()
+
+        self._state.enable(GL.GL_TEXTURE_2D)
 
-        GL.glEnable(GL.GL_BLEND)
-        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+        self._state.enable(GL.GL_BLEND)
+        self._state.blend_func_separate(*self._blend)
 
-        GL.glViewport(0, 0, self._size.width, self._size.height)
+        self._state.viewport(0, 0, int(self._size.width), int(self._size.height))
 
     def _draw(self) -> None:
         assert self._renderer is not None
 
-        GL.glUseProgram(self._program)
-        GL.glUniformMatrix4fv(self._loc_view, 1, GL.GL_TRUE, self._view)
+        self._state.use_program(self._program)
+        self._state.uniform_matrix4(self._loc_view, self._view)
         self._renderer.render()
-        GL.glUseProgram(0)
 
-    def _teardown(self) -> None:
-        GL.glDisable(GL.GL_BLEND)
-        GL.glDisable(GL.GL_TEXTURE_2D)
+
+class CachedFormationGroup:
+    """
+    Composes plains into an offscreen texture only after they were set and draws that texture with
+    a single quad on every frame, so drawing costs the same no matter how many plains there are.
+    """
+
+    def __init__(
+        self,
+        instanced: bool = False,
+        state: Optional[glstate.GlState] = None,
+        registry: Optional[programs.ProgramRegistry] = None,
+    ) -> None:
+        self._state = state if state is not None else glstate.GlState()
+        self._fbo = graphics.Fbo()
+        self._composer = FormationGroup(instanced, self._state, BLEND_COMPOSE, registry)
+        self._compositor = FormationGroup(instanced, self._state, BLEND_PREMULTIPLIED, registry)
+        self._stats = RenderStats()
+        self._is_ready = False
+        self._is_dirty = True
+
+    def get_stats(self) -> RenderStats:
+        """Returns draw call statistics of the most recent `render` call, including composing."""
+
+        return self._stats
+
+    def set_plains(self, plains: Union[List[formations.Plain], numpy.ndarray]) -> None:
+        self._composer.set_plains(plains)
+        self._is_dirty = True
+
+    def invalidate(self) -> None:
+        """Composes the plains again on the next `render`, e.g. after their textures changed."""
+
+        self._is_dirty = True
+
+    def resize(self, width: float, height: float) -> None:
+        self._fbo.resize(max(1, int(width)), max(1, int(height)))
+        self._composer.resize(width, height)
+        self._compositor.resize(width, height)
+
+        # The texture holds rows bottom-up, so the quad has to be flipped.
+        size = formations.Size(width, height)
+        record = formations.make_plain_record(
+            self._fbo.get_color_texture_id(), None, 0.0, 0.0, size, True, self._fbo.get_uv()
+        )
+        self._compositor.set_plains(formations.records_to_array([record]))
+        self._is_ready = True
+        self._is_dirty = True
+
+    def render(self) -> None:
+        self._stats.reset()
+        if not self._is_ready:
+            return
+
+        if self._is_dirty:
+            self._compose()
+            self._stats.add(self._composer.get_stats())
+
+        self._compositor.render()
+        self._stats.add(self._compositor.get_stats())
+
+    def _compose(self) -> None:
+        # Plains are drawn in order, so depth testing left enabled by other code must not interfere.
+        self._state.disable(GL.GL_DEPTH_TEST)
+        with self._fbo:
+            # Unlike `glClear`, this keeps the clear color other code may rely on.
+            GL.glClearBufferfv(GL.GL_COLOR, 0, _TRANSPARENT)
+            self._composer.render()
+        self._is_dirty = False
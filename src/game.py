@@ -1,23 +1,74 @@
+import json
+
+from typing import Optional
+
 import edgin_around_rendering as ear
-from . import thruster, connector, controls, gui, lan, proxy, window
+from . import thruster, assets, benchmark, bundle, connector, controls, glfast, gpu_resources, gui
+from . import lan, options, pacing, graphics, profiling, programs, proxy, window
 
 
 class Game:
     """The main class of the client (frontend) side of the game."""
 
-    def __init__(self, resource_dir: str) -> None:
+    def __init__(self, resource_dir: str, options: options.Options) -> None:
         ear.init()
 
+        if options.fast_gl:
+            glfast.use_fast_path()
+        if options.pixel_buffer_uploads:
+            graphics.use_pixel_buffers()
+        gpu_budget = options.gpu_budget_mb
+        gpu_resources.RESOURCES.set_budget(int(gpu_budget * 2**20) if gpu_budget else None)
+
+        self.programs = programs.ProgramRegistry(resource_dir, options.shader_cache_dir)
+        self.programs.compile_all()
+
+        self.profiler = profiling.Profiler(
+            enabled=options.profile
+            or options.profile_overlay
+            or options.profile_dump is not None
+            or options.slow_frame_budget is not None
+            or options.benchmark_frames is not None,
+            dump_path=options.profile_dump,
+            slow_frame_budget=options.slow_frame_budget,
+            capture_dir=options.slow_frame_dir,
+        )
+
         self.proxy = proxy.Proxy()
+        self.bundle = None
+        if options.resource_bundle is not None:
+            self.bundle = bundle.ResourceBundle(options.resource_bundle)
+        self.assets = assets.AssetLoader(options.asset_upload_budget, resource_bundle=self.bundle)
 
         self.scene = ear.Scene()
         self.world = ear.WorldExpositor(resource_dir, (600, 800))
-        self.gui = gui.Gui(self.world, self.scene, self.proxy, resource_dir)
+        self.gui = gui.Gui(
+            self.world,
+            self.scene,
+            self.proxy,
+            resource_dir,
+            options,
+            self.programs,
+            self.profiler,
+            self.assets,
+        )
         self.controls = controls.Controls(self.world, self.gui, self.proxy)
-        self.thruster = thruster.Thruster(self.scene, self.world, self.gui, resource_dir)
+        self.thruster = thruster.Thruster(
+            self.scene, self.world, self.gui, resource_dir, self.assets
+        )
 
-        self.window = window.Window(self.gui, self.controls, self.thruster)
-        self.connector = connector.Connector(self.thruster)
+        self.pacer = pacing.FramePacer(options.max_fps, options.idle_fps)
+
+        self.window = window.Window(
+            self.gui,
+            self.controls,
+            self.thruster,
+            self.pacer,
+            self.profiler,
+            options.vsync,
+            options.window_size,
+        )
+        self.connector = connector.Connector(self.thruster, self.pacer.wake, options.record_path)
 
     def run(self) -> None:
         print("Welcome to Edgin' Around!")
@@ -32,5 +83,31 @@ class Game:
 
         self.window.run()
         self.connector.stop()
+        self.profiler.stop()
+        self.gui.dispose()
+        self.assets.shutdown()
 
         print("Bye!")
+
+    def benchmark(
+        self, frames: int, stream_path: Optional[str], report_path: Optional[str]
+    ) -> None:
+        """
+        Renders `frames` frames with no server, replaying the recording at `stream_path` or a
+        synthetic scene, and prints the report (also written to `report_path` if given).
+        """
+
+        source = benchmark.load_source(stream_path)
+        runner = benchmark.Benchmark(
+            self.window, self.gui, self.thruster, self.profiler, source, frames
+        )
+        report = runner.run()
+        self.profiler.stop()
+        self.gui.dispose()
+        self.assets.shutdown()
+
+        text = json.dumps(report, indent=2)
+        print(text)
+        if report_path is not None:
+            with open(report_path, "w") as report_file:
+                report_file.write(text + "\n")
@@ -0,0 +1,118 @@
+"""
+OpenGL entry points called in the draw loop.
+
+By default the functions of this module are the PyOpenGL wrappers, which convert arguments and check
+for errors after every call. `use_fast_path` rebinds them to the raw driver functions called through
+`ctypes` with no conversion and no error checking, which is considerably cheaper per call. Both
+variants accept the same arguments; arrays must be contiguous NumPy arrays of the right type.
+"""
+
+import ctypes
+import numpy
+
+from OpenGL import GL, platform
+
+from typing import Any, Callable
+
+_fast_path_enabled = False
+
+glActiveTexture: Callable[..., Any] = GL.glActiveTexture
+glBindBuffer: Callable[..., Any] = GL.glBindBuffer
+glBindFramebuffer: Callable[..., Any] = GL.glBindFramebuffer
+glBindTexture: Callable[..., Any] = GL.glBindTexture
+glBindVertexArray: Callable[..., Any] = GL.glBindVertexArray
+glBlendFuncSeparate: Callable[..., Any] = GL.glBlendFuncSeparate
+glBufferData: Callable[..., Any] = GL.glBufferData
+glBufferSubData: Callable[..., Any] = GL.glBufferSubData
+glDisable: Callable[..., Any] = GL.glDisable
+glDrawElements: Callable[..., Any] = GL.glDrawElements
+glDrawElementsInstanced: Callable[..., Any] = GL.glDrawElementsInstanced
+glEnable: Callable[..., Any] = GL.glEnable
+glUniformMatrix4fv: Callable[..., Any] = GL.glUniformMatrix4fv
+glUseProgram: Callable[..., Any] = GL.glUseProgram
+glVertexAttribPointer: Callable[..., Any] = GL.glVertexAttribPointer
+glViewport: Callable[..., Any] = GL.glViewport
+
+
+def is_fast_path_enabled() -> bool:
+    return _fast_path_enabled
+
+
+def use_fast_path(enabled: bool = True) -> None:
+    """
+    Selects the raw `ctypes` entry points (or the PyOpenGL ones if `enabled` is `False`). Has to be
+    called with a current OpenGL context, as some platforms resolve function addresses per context.
+    """
+
+    global _fast_path_enabled
+    functions = _make_fast_functions() if enabled else _make_pyopengl_functions()
+    globals().update(functions)
+    _fast_path_enabled = enabled
+
+
+def _make_pyopengl_functions() -> dict:
+    return {name: getattr(GL, name) for name in _SIGNATURES}
+
+
+def _make_fast_functions() -> dict:
+    raw = {name: _bind(name, *signature) for name, signature in _SIGNATURES.items()}
+
+    buffer_data = raw["glBufferData"]
+    buffer_sub_data = raw["glBufferSubData"]
+    uniform_matrix4fv = raw["glUniformMatrix4fv"]
+
+    def glBufferData(target: int, size: int, data: Any, usage: int) -> None:
+        buffer_data(target, size, _address(data), usage)
+
+    def glBufferSubData(target: int, offset: int, size: int, data: Any) -> None:
+        buffer_sub_data(target, offset, size, _address(data))
+
+    def glUniformMatrix4fv(location: int, count: int, transpose: int, value: Any) -> None:
+        uniform_matrix4fv(location, count, transpose, _address(value))
+
+    raw["glBufferData"] = glBufferData
+    raw["glBufferSubData"] = glBufferSubData
+    raw["glUniformMatrix4fv"] = glUniformMatrix4fv
+    return raw
+
+
+def _address(data: Any) -> Any:
+    if isinstance(data, numpy.ndarray):
+        return data.ctypes.data
+    return data
+
+
+def _bind(name: str, restype: Any, *argtypes: Any) -> Callable[..., Any]:
+    address = platform.PLATFORM.getExtensionProcedure(name.encode())
+    if not address:
+        address = ctypes.cast(getattr(platform.PLATFORM.GL, name), ctypes.c_void_p).value
+    if not address:
+        raise RuntimeError(f"OpenGL function '{name}' is not available")
+    prototype = ctypes.CFUNCTYPE(restype, *argtypes)
+    return prototype(address)
+
+
+_c_enum = ctypes.c_uint
+_c_uint = ctypes.c_uint
+_c_int = ctypes.c_int
+_c_size = ctypes.c_ssize_t
+_c_ptr = ctypes.c_void_p
+
+_SIGNATURES = {
+    "glActiveTexture": (None, _c_enum),
+    "glBindBuffer": (None, _c_enum, _c_uint),
+    "glBindFramebuffer": (None, _c_enum, _c_uint),
+    "glBindTexture": (None, _c_enum, _c_uint),
+    "glBindVertexArray": (None, _c_uint),
+    "glBlendFuncSeparate": (None, _c_enum, _c_enum, _c_enum, _c_enum),
+    "glBufferData": (None, _c_enum, _c_size, _c_ptr, _c_enum),
+    "glBufferSubData": (None, _c_enum, _c_size, _c_size, _c_ptr),
+    "glDisable": (None, _c_enum),
+    "glDrawElements": (None, _c_enum, _c_int, _c_enum, _c_ptr),
+    "glDrawElementsInstanced": (None, _c_enum, _c_int, _c_enum, _c_ptr, _c_int),
+    "glEnable": (None, _c_enum),
+    "glUniformMatrix4fv": (None, _c_int, _c_int, ctypes.c_ubyte, _c_ptr),
+    "glUseProgram": (None, _c_uint),
+    "glVertexAttribPointer": (None, _c_uint, _c_int, _c_enum, ctypes.c_ubyte, _c_int, _c_ptr),
+    "glViewport": (None, _c_int, _c_int, _c_int, _c_int),
+}
@@ -0,0 +1,192 @@
+import numpy
+
+from OpenGL import GL
+
+from typing import Dict, List, Optional, Tuple
+
+from . import glfast, gpu_resources
+
+
+class GlState:
+    """
+    Keeps track of the OpenGL state set through it and skips calls that would not change anything.
+
+    The tracked state is only valid as long as all state changes go through this object. Code
+    changing the state directly (like the native world renderer or texture uploads) must be followed
+    by `invalidate` or `invalidate_textures`. Uniform values are stored per program, so they stay
+    valid across foreign rendering which uses its own programs.
+    """
+
+    def __init__(self) -> None:
+        self.issued = 0
+        self.skipped = 0
+
+        self._uniforms: Dict[Tuple[int, int], bytes] = dict()
+        self.invalidate()
+
+    def reset_counters(self) -> None:
+        self.issued = 0
+        self.skipped = 0
+
+    def invalidate(self) -> None:
+        """Forgets all tracked state except uniform values."""
+
+        self._program: Optional[int] = None
+        self._vertex_array: Optional[int] = None
+        self._buffers: Dict[Optional[int], int] = dict()
+        self._element_buffers: Dict[Optional[int], int] = dict()
+        self._capabilities: Dict[int, bool] = dict()
+        self._blend_func: Optional[Tuple[int, int, int, int]] = None
+        self._viewport: Optional[Tuple[int, int, int, int]] = None
+        self.invalidate_textures()
+
+    def invalidate_textures(self) -> None:
+        """Forgets texture bindings, e.g. after textures were uploaded directly."""
+
+        self._active_texture: Optional[int] = None
+        self._textures: Dict[Tuple[Optional[int], int], int] = dict()
+
+    def forget_program(self, program: int) -> None:
+        """Forgets uniform values of a deleted program."""
+
+        self._uniforms = {key: v for key, v in self._uniforms.items() if key[0] != program}
+
+    def reset(self) -> None:
+        """
+        Restores the default state (no program, vertex array or textures bound and blending
+        disabled) before handing over to code which does not use this object.
+        """
+
+        self.use_program(0)
+        self.bind_vertex_array(0)
+        self.bind_buffer(GL.GL_ARRAY_BUFFER, 0)
+        for (unit, target), texture in list(self._textures.items()):
+            if unit is not None and texture != 0:
+                self.active_texture(unit)
+                self.bind_texture(target, 0)
+        self.active_texture(GL.GL_TEXTURE0)
+        self.disable(GL.GL_BLEND)
+
+    def use_program(self, program: int) -> None:
+        if self._program != program:
+            glfast.glUseProgram(program)
+            self._program = program
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def bind_vertex_array(self, vertex_array: int) -> None:
+        if self._vertex_array != vertex_array:
+            glfast.glBindVertexArray(vertex_array)
+            self._vertex_array = vertex_array
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def bind_buffer(self, target: int, buffer: int) -> None:
+        # The element array buffer binding is a part of the vertex array state.
+        if target == GL.GL_ELEMENT_ARRAY_BUFFER:
+            bindings, key = self._element_buffers, self._vertex_array
+        else:
+            bindings, key = self._buffers, target
+
+        if key is None or bindings.get(key) != buffer:
+            glfast.glBindBuffer(target, buffer)
+            if key is not None:
+                bindings[key] = buffer
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def delete_buffers(self, buffers: List[int]) -> None:
+        """Deletes buffers and forgets their bindings, as their names may be reused."""
+
+        GL.glDeleteBuffers(len(buffers), numpy.array(buffers, dtype=numpy.uint32))
+        for buffer in buffers:
+            gpu_resources.RESOURCES.forget(gpu_resources.BUFFER, buffer)
+        for bindings in (self._buffers, self._element_buffers):
+            for key, buffer in list(bindings.items()):
+                if buffer in buffers:
+                    bindings[key] = 0
+
+    def active_texture(self, unit: int) -> None:
+        if self._active_texture != unit:
+            glfast.glActiveTexture(unit)
+            self._active_texture = unit
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def bind_texture(self, target: int, texture: int) -> None:
+        if self._active_texture is None:
+            self.active_texture(GL.GL_TEXTURE0)
+
+        key = (self._active_texture, target)
+        if self._textures.get(key) != texture:
+            glfast.glBindTexture(target, texture)
+            self._textures[key] = texture
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def enable(self, capability: int) -> None:
+        self._set_capability(capability, True)
+
+    def disable(self, capability: int) -> None:
+        self._set_capability(capability, False)
+
+    def blend_func(self, src: int, dst: int) -> None:
+        self.blend_func_separate(src, dst, src, dst)
+
+    def blend_func_separate(
+        self, src_rgb: int, dst_rgb: int, src_alpha: int, dst_alpha: int
+    ) -> None:
+        func = (src_rgb, dst_rgb, src_alpha, dst_alpha)
+        if self._blend_func != func:
+            glfast.glBlendFuncSeparate(src_rgb, dst_rgb, src_alpha, dst_alpha)
+            self._blend_func = func
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def viewport(self, x: int, y: int, width: int, height: int) -> None:
+        viewport = (x, y, width, height)
+        if self._viewport != viewport:
+            glfast.glViewport(x, y, width, height)
+            self._viewport = viewport
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def uniform_matrix4(self, location: int, matrix: numpy.ndarray, transpose: bool = True) -> None:
+        """Sets a matrix uniform of the currently used program."""
+
+        assert self._program is not None
+        key = (self._program, location)
+        value = matrix.tobytes() + (b"T" if transpose else b"N")
+        if self._uniforms.get(key) != value:
+            glfast.glUniformMatrix4fv(location, 1, GL.GL_TRUE if transpose else GL.GL_FALSE, matrix)
+            self._uniforms[key] = value
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def _set_capability(self, capability: int, enabled: bool) -> None:
+        if self._capabilities.get(capability) != enabled:
+            if enabled:
+                glfast.glEnable(capability)
+            else:
+                glfast.glDisable(capability)
+            self._capabilities[capability] = enabled
+            self._count_issued()
+        else:
+            self._count_skipped()
+
+    def _count_issued(self) -> None:
+        self.issued += 1
+
+    def _count_skipped(self) -> None:
+        self.skipped += 1
+
+    def __repr__(self) -> str:
+        return f"GlState(issued: {self.issued}, skipped: {self.skipped})"
@@ -0,0 +1,198 @@
+from OpenGL import GL
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Kinds of tracked objects. Names of textures and buffers are separate, so both are part of keys.
+TEXTURE = "texture"
+BUFFER = "buffer"
+
+# Category of objects registered only by their size, without telling what they are.
+OTHER = "other"
+
+_Key = Tuple[str, int]
+
+# Frees unused objects of its owner, asked for at least the given number of bytes, and returns the
+# number of bytes it freed.
+Evictor = Callable[[int], int]
+
+
+class GpuHandle:
+    """
+    Ownership of a texture created by `GpuResourceManager.create_texture`. The texture is deleted
+    when the handle is released or dropped; dropped handles are only queued, and the textures are
+    deleted by `GpuResourceManager.collect` on the GL thread.
+    """
+
+    def __init__(self, manager: "GpuResourceManager", texture_id: int) -> None:
+        self.texture_id = texture_id
+        self._manager: Optional[GpuResourceManager] = manager
+
+    def release(self) -> None:
+        if self._manager is not None:
+            self._manager._release_later((TEXTURE, self.texture_id))
+            self._manager = None
+
+    def __del__(self) -> None:
+        self.release()
+
+
+class _Resource:
+    def __init__(self, category: str, is_owned: bool) -> None:
+        self.category = category
+        self.is_owned = is_owned
+        self.size = 0
+        self.dimensions: Optional[Tuple[int, int]] = None
+
+
+class GpuResourceManager:
+    """
+    Textures and buffers alive on the GPU, with their categories and sizes in bytes.
+
+    Objects are either owned by a `GpuHandle` and deleted once it is gone, or tracked for their
+    size only and deleted by whoever created them, which has to `forget` them then. Once the tracked
+    objects take more than `budget` bytes, `collect` asks the registered evictors, such as caches
+    of textures nothing uses, to free the excess.
+    """
+
+    BUDGET = 512 * 2**20
+
+    def __init__(self, budget: Optional[int] = BUDGET) -> None:
+        self._budget = budget
+        self._resources: Dict[_Key, _Resource] = dict()
+        self._released: List[_Key] = list()
+        self._evictors: List[Evictor] = list()
+        self._is_over_budget = False
+
+        self.deletions = 0
+        self.evicted_bytes = 0
+
+    def set_budget(self, budget: Optional[int]) -> None:
+        """Sets the budget in bytes (unlimited if `None`)."""
+
+        self._budget = budget
+
+    def add_evictor(self, evictor: Evictor) -> None:
+        self._evictors.append(evictor)
+
+    def remove_evictor(self, evictor: Evictor) -> None:
+        if evictor in self._evictors:
+            self._evictors.remove(evictor)
+
+    def create_texture(self, category: str) -> GpuHandle:
+        """Creates a texture deleted together with the returned handle."""
+
+        texture_id = int(GL.glGenTextures(1))
+        self._resources[(TEXTURE, texture_id)] = _Resource(category, True)
+        return GpuHandle(self, texture_id)
+
+    def track(self, kind: str, object_id: int, category: str) -> None:
+        """Starts tracking an object its creator will delete."""
+
+        # PyOpenGL may return names as NumPy integers; keys hold plain ones.
+        key = (kind, int(object_id))
+        resource = self._resources.get(key)
+        if resource is None:
+            self._resources[key] = _Resource(category, False)
+        else:
+            resource.category = category
+
+    def forget(self, kind: str, object_id: int) -> None:
+        """Stops tracking an object which was deleted."""
+
+        self._resources.pop((kind, int(object_id)), None)
+
+    def set_size(self, kind: str, object_id: int, size: int) -> None:
+        self._get_resource(kind, object_id).size = size
+
+    def set_texture_size(
+        self, texture_id: int, width: int, height: int, bytes_per_pixel: int = 4
+    ) -> None:
+        resource = self._get_resource(TEXTURE, texture_id)
+        resource.dimensions = (width, height)
+        resource.size = bytes_per_pixel * width * height
+
+    def get_texture_size(self, texture_id: int) -> Optional[Tuple[int, int]]:
+        """Returns the width and height of the storage last allocated for the texture, if known."""
+
+        resource = self._resources.get((TEXTURE, int(texture_id)))
+        return resource.dimensions if resource is not None else None
+
+    def collect(self) -> None:
+        """
+        Deletes textures whose handles were dropped and evicts objects while over the budget.
+        Has to be called with a current OpenGL context, once a frame.
+        """
+
+        released, self._released = self._released, list()
+        if len(released) > 0:
+            texture_ids = list()
+            for key in released:
+                resource = self._resources.pop(key, None)
+                if resource is not None and resource.is_owned:
+                    texture_ids.append(key[1])
+            if len(texture_ids) > 0:
+                GL.glDeleteTextures(texture_ids)
+                self.deletions += len(texture_ids)
+
+        self._evict()
+
+    def get_total_size(self) -> int:
+        return sum(resource.size for resource in self._resources.values())
+
+    def get_usage(self) -> Dict[str, int]:
+        """Returns bytes used by each category."""
+
+        usage: Dict[str, int] = dict()
+        for resource in self._resources.values():
+            usage[resource.category] = usage.get(resource.category, 0) + resource.size
+        return usage
+
+    def get_stats(self) -> Dict[str, object]:
+        kinds = [kind for kind, _ in self._resources.keys()]
+        return {
+            "textures": kinds.count(TEXTURE),
+            "buffers": kinds.count(BUFFER),
+            "bytes": self.get_total_size(),
+            "budget": self._budget,
+            "deletions": self.deletions,
+            "evicted_bytes": self.evicted_bytes,
+            "categories": self.get_usage(),
+        }
+
+    def _get_resource(self, kind: str, object_id: int) -> _Resource:
+        key = (kind, int(object_id))
+        resource = self._resources.get(key)
+        if resource is None:
+            resource = self._resources[key] = _Resource(OTHER, False)
+        return resource
+
+    def _release_later(self, key: _Key) -> None:
+        # May be called by the garbage collector on any thread, so only queue the key here.
+        self._released.append(key)
+
+    def _evict(self) -> None:
+        if self._budget is None:
+            return
+
+        excess = self.get_total_size() - self._budget
+        for evictor in self._evictors:
+            if excess <= 0:
+                break
+            freed = evictor(excess)
+            self.evicted_bytes += freed
+            excess -= freed
+
+        # Objects in use are never evicted, so the budget can only be reported as exceeded.
+        if excess > 0 and not self._is_over_budget:
+            print(f"GPU memory budget exceeded by {excess / 2**20:.1f} MB")
+        self._is_over_budget = excess > 0
+
+    def __repr__(self) -> str:
+        return (
+            f"GpuResourceManager(objects: {len(self._resources)}, "
+            f"bytes: {self.get_total_size()}, deletions: {self.deletions})"
+        )
+
+
+# Objects are shared by the whole process, as they all live in the one OpenGL context.
+RESOURCES = GpuResourceManager()
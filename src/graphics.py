@@ -2,33 +2,44 @@ import ctypes
 import numpy
 
 from OpenGL import GL
+from PIL import Image
+
+from typing import List, Optional, Tuple
+
+from . import glfast, gpu_resources
 
 
 class Fbo:
+    """
+    Framebuffer with color and depth textures.
+
+    Storage is allocated in buckets of `BUCKET` pixels and only reallocated when the requested size
+    does not fit or wastes most of the storage, so the used area may cover only a part of the
+    textures. Rendering has to set the viewport to `get_size` and sampling has to use `get_uv`.
+    """
+
+    BUCKET = 256
+
     def __init__(self) -> None:
+        self._size = (0, 0)
+        self._capacity = (0, 0)
+
         self._fbo = GL.glGenFramebuffers(1)
         GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
 
         self._texture_color = GL.glGenTextures(1)
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, self._texture_color, "framebuffers")
         GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_color)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
 
         self._texture_depth = GL.glGenTextures(1)
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, self._texture_depth, "framebuffers")
         GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_depth)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
 
-        if GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER) != GL.GL_FRAMEBUFFER_COMPLETE:
-            print("Framebuffer not complete")
-
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
-
-    def get_color_texture_id(self) -> int:
-        return self._texture_color
-
-    def attach(self) -> None:
-        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
+        # Attachments refer to texture objects, so they stay valid when `resize` reallocates storage.
         GL.glFramebufferTexture2D(
             GL.GL_FRAMEBUFFER,
             GL.GL_COLOR_ATTACHMENT0,
@@ -44,10 +55,44 @@ class Fbo:
             0,
         )
 
-    def detach(self) -> None:
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
         GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
 
-    def resize(self, width: float, height: float) -> None:
+    def get_color_texture_id(self) -> int:
+        return self._texture_color
+
+    def get_size(self) -> Tuple[int, int]:
+        return self._size
+
+    def get_uv(self) -> Tuple[float, float, float, float]:
+        """Returns the texture coordinates of the used area."""
+
+        (width, height), (capacity_width, capacity_height) = self._size, self._capacity
+        if capacity_width == 0 or capacity_height == 0:
+            return (0.0, 0.0, 1.0, 1.0)
+        return (0.0, 0.0, width / capacity_width, height / capacity_height)
+
+    def attach(self) -> None:
+        glfast.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
+
+    def detach(self) -> None:
+        glfast.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+
+    def resize(self, width: int, height: int) -> None:
+        self._size = (width, height)
+
+        capacity_width, capacity_height = self._capacity
+        fits = width <= capacity_width and height <= capacity_height
+        if fits and 4 * width * height >= capacity_width * capacity_height:
+            return
+
+        self._capacity = (self._round_up(width), self._round_up(height))
+        self._allocate(*self._capacity)
+
+    def _round_up(self, value: int) -> int:
+        return max(1, -(-value // self.BUCKET)) * self.BUCKET
+
+    def _allocate(self, width: int, height: int) -> None:
         GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_color)
         GL.glTexImage2D(
             GL.GL_TEXTURE_2D,
@@ -75,6 +120,13 @@ class Fbo:
         )
 
         GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        gpu_resources.RESOURCES.set_texture_size(self._texture_color, width, height)
+        gpu_resources.RESOURCES.set_texture_size(self._texture_depth, width, height)
+
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
+        if GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER) != GL.GL_FRAMEBUFFER_COMPLETE:
+            print("Framebuffer not complete")
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
 
     def __enter__(self) -> "Fbo":
         self.attach()
@@ -82,3 +134,199 @@ class Fbo:
 
     def __exit__(self, type, value, traceback) -> None:
         self.detach()
+
+
+class PixelBufferRing:
+    """
+    Pixel buffer objects taking turns as the source of texture uploads.
+
+    Pixels are copied into a mapped buffer and the texture is updated from there, so the call
+    returns without the driver copying client memory or waiting for the GPU. A buffer which an
+    earlier upload may still be reading from gets fresh storage instead of being waited for.
+    """
+
+    SLOTS = 4
+
+    def __init__(self, slots: int = SLOTS) -> None:
+        self._buffers = [int(buffer) for buffer in GL.glGenBuffers(slots)]
+        for buffer in self._buffers:
+            gpu_resources.RESOURCES.track(gpu_resources.BUFFER, buffer, "pixel buffers")
+        self._capacities = [0] * slots
+        self._fences: List[Optional[int]] = [None] * slots
+        self._next = 0
+
+        self.uploads = 0
+        self.orphans = 0
+
+    def upload(
+        self,
+        texture_id: int,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        pixels: numpy.ndarray,
+        level: int = 0,
+    ) -> None:
+        slot = self._next
+        self._next = (slot + 1) % len(self._buffers)
+        size = pixels.nbytes
+
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, self._buffers[slot])
+
+        fence = self._fences[slot]
+        is_busy = False
+        if fence is not None:
+            is_busy = GL.glClientWaitSync(fence, 0, 0) == GL.GL_TIMEOUT_EXPIRED
+            GL.glDeleteSync(fence)
+
+        if is_busy or size > self._capacities[slot]:
+            self._capacities[slot] = max(size, self._capacities[slot])
+            gpu_resources.RESOURCES.set_size(
+                gpu_resources.BUFFER, self._buffers[slot], self._capacities[slot]
+            )
+            GL.glBufferData(
+                GL.GL_PIXEL_UNPACK_BUFFER, self._capacities[slot], None, GL.GL_STREAM_DRAW
+            )
+            self.orphans += int(is_busy)
+
+        pointer = GL.glMapBufferRange(
+            GL.GL_PIXEL_UNPACK_BUFFER,
+            0,
+            size,
+            GL.GL_MAP_WRITE_BIT | GL.GL_MAP_INVALIDATE_RANGE_BIT,
+        )
+        ctypes.memmove(pointer, pixels.ctypes.data, size)
+        GL.glUnmapBuffer(GL.GL_PIXEL_UNPACK_BUFFER)
+
+        GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+        GL.glTexSubImage2D(
+            GL.GL_TEXTURE_2D,
+            level,
+            x,
+            y,
+            width,
+            height,
+            GL.GL_RGBA,
+            GL.GL_UNSIGNED_BYTE,
+            ctypes.c_void_p(0),
+        )
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self._fences[slot] = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+        # Client memory uploads elsewhere would read from the buffer if it stayed bound.
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        self.uploads += 1
+
+    def delete(self) -> None:
+        for fence in self._fences:
+            if fence is not None:
+                GL.glDeleteSync(fence)
+        GL.glDeleteBuffers(len(self._buffers), self._buffers)
+        for buffer in self._buffers:
+            gpu_resources.RESOURCES.forget(gpu_resources.BUFFER, buffer)
+
+    def __repr__(self) -> str:
+        return f"PixelBufferRing(uploads: {self.uploads}, orphans: {self.orphans})"
+
+
+_pixel_buffers: Optional[PixelBufferRing] = None
+
+
+def use_pixel_buffers(enabled: bool = True) -> None:
+    """
+    Selects uploading through a `PixelBufferRing` (or directly from client memory if `enabled` is
+    `False`). Has to be called with a current OpenGL context.
+    """
+
+    global _pixel_buffers
+    if enabled and _pixel_buffers is None:
+        _pixel_buffers = PixelBufferRing()
+    elif not enabled and _pixel_buffers is not None:
+        _pixel_buffers.delete()
+        _pixel_buffers = None
+
+
+def allocate_texture(texture_id: int, width: int, height: int, level: int = 0) -> None:
+    """
+    Allocates RGBA storage for a mipmap level of the texture. The contents are undefined. Parameters
+    of the texture are left as they are.
+    """
+
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+    GL.glTexImage2D(
+        GL.GL_TEXTURE_2D,
+        level,
+        GL.GL_RGBA,
+        width,
+        height,
+        0,
+        GL.GL_RGBA,
+        GL.GL_UNSIGNED_BYTE,
+        ctypes.c_void_p(0),
+    )
+    GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+
+def allocate_plain_texture(texture_id: int, width: int, height: int) -> None:
+    """
+    Allocates RGBA storage for a texture without mipmaps, sets linear filtering and records the size
+    of the texture.
+    """
+
+    allocate_texture(texture_id, width, height)
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+    GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+    gpu_resources.RESOURCES.set_texture_size(texture_id, width, height)
+
+
+def delete_texture(texture_id: int) -> None:
+    """Deletes a texture which is not owned by a `GpuHandle`."""
+
+    gpu_resources.RESOURCES.forget(gpu_resources.TEXTURE, texture_id)
+    GL.glDeleteTextures([texture_id])
+
+
+def upload_pixels(
+    texture_id: int,
+    x: int,
+    y: int,
+    width: int,
+    height: int,
+    pixels: numpy.ndarray,
+    level: int = 0,
+) -> None:
+    """Replaces a rectangle of an allocated RGBA texture level with contiguous RGBA bytes."""
+
+    if _pixel_buffers is not None:
+        _pixel_buffers.upload(texture_id, x, y, width, height, pixels, level)
+        return
+
+    GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+    GL.glTexSubImage2D(
+        GL.GL_TEXTURE_2D, level, x, y, width, height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixels
+    )
+    GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+
+def upload_image(texture_id: int, image: Image.Image, bottom_up: bool = False) -> int:
+    """
+    Uploads the image as RGBA to the texture and returns the number of bytes uploaded. Storage is
+    only allocated if the texture was not allocated for an image of the same size before.
+
+    The pixel buffer of PIL is handed to OpenGL directly, without per-pixel Python objects. Rows go
+    top first, as PIL stores them, or bottom first if `bottom_up` is set.
+    """
+
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    if bottom_up:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    pixels = numpy.frombuffer(image.tobytes(), dtype=numpy.uint8)
+
+    if gpu_resources.RESOURCES.get_texture_size(texture_id) != image.size:
+        allocate_plain_texture(texture_id, image.width, image.height)
+    upload_pixels(texture_id, 0, 0, image.width, image.height, pixels)
+    return pixels.nbytes
@@ -1,47 +1,91 @@
-import enum, math, os
+import enum, math, os, time
 
-import pyglet
+import numpy, pyglet
 
-from typing import cast, List, Optional, Union
+from typing import cast, Dict, List, Optional, Tuple, Union
 
 import edgin_around_rendering as ear
 from edgin_around_api import craft, defs, inventory
-from . import formations, formations_images, formations_renderer, graphics, media, proxy
+from . import assets, formations, formations_images, formations_renderer, glstate, gpu_resources
+from . import graphics, media, mipmaps, options, pacing, profiling, programs, proxy, text
 
 
 _INVENTORY_IMAGE_SIZE = formations.Size(100, 100)
 
 
 class WorldFormation(formations.Formation):
+    # While covered by an overlay, the world is rendered at this fraction of the current resolution
+    # and at most once per this many seconds. The last frame is reused in between.
+    COVERED_SCALE = 0.5
+    COVERED_INTERVAL = 0.25
+
     def __init__(
-        self, world: ear.WorldExpositor, scene: ear.Scene, proxy: proxy.Proxy, resource_dir: str
+        self,
+        world: ear.WorldExpositor,
+        scene: ear.Scene,
+        proxy: proxy.Proxy,
+        resource_dir: str,
+        state: glstate.GlState,
+        scaler: pacing.ResolutionScaler,
     ) -> None:
         super().__init__()
         self._world = world
         self._scene = scene
         self._proxy = proxy
+        self._state = state
+        self._scaler = scaler
         self._fbo = graphics.Fbo()
         self._flip_vertical = True
+        self._is_covered = False
+        self._render_time = -math.inf
 
     def resize(self, size: formations.Size) -> bool:
         if super().resize(size):
-            size = self.get_size()
-            width, height = int(size.width), int(size.height)
-
-            self._fbo.resize(width, height)
-            self._world.resize(width, height)
-
-            content = formations.Content(size, self._fbo.get_color_texture_id())
-            self.set_content(content)
-
+            self.rescale()
             return True
 
         else:
             return False
 
+    def set_is_covered(self, is_covered: bool) -> None:
+        """Switches to rendering at reduced rate and resolution while an overlay hides the world."""
+
+        if self._is_covered != is_covered:
+            self._is_covered = is_covered
+            self._render_time = -math.inf
+            self.rescale()
+
+    def rescale(self) -> None:
+        """Resizes the rendering buffer after the resolution scale changed."""
+
+        size, scale = self.get_size(), self._scaler.get_scale()
+        if self._is_covered:
+            scale *= self.COVERED_SCALE
+        width = max(1, int(size.width * scale))
+        height = max(1, int(size.height * scale))
+        if (width, height) != self._fbo.get_size():
+            self._fbo.resize(width, height)
+            self._world.resize(width, height)
+
+        # The content keeps the size of the formation, so the used part of the texture gets
+        # stretched over it.
+        texture_id, uv = self._fbo.get_color_texture_id(), self._fbo.get_uv()
+        self.set_content(formations.Content(size, texture_id, uv=uv))
+        self.mark_as_needs_update()
+
     def draw(self) -> None:
+        now = time.monotonic()
+        if self._is_covered and now < self._render_time + self.COVERED_INTERVAL:
+            return
+        self._render_time = now
+
+        # The native renderer does not know about the tracked state, so hand it over in the default
+        # state and forget everything afterwards.
+        self._state.reset()
+        self._state.viewport(0, 0, *self._fbo.get_size())
         with self._fbo:
             self._world.render(self._scene)
+        self._state.invalidate()
 
     def on_grab(self, position: formations.Position, *args) -> formations.EventResult:
         button, modifiers = args
@@ -58,12 +102,21 @@ class WorldFormation(formations.Formation):
 
 
 class MapFormation(formations.Formation):
-    def __init__(self, resource_dir: str) -> None:
+    def __init__(self, resource_dir: str, loader: Optional[assets.AssetLoader] = None) -> None:
         super().__init__()
 
+        # The map is shown much smaller than its file, so it is drawn from a coarser mipmap level.
         file_path = os.path.join(resource_dir, "images/map.png")
-        content = formations_images.ImageFileContent(file_path)
-        self.set_content(content)
+        self._texture = mipmaps.MipMappedTexture(file_path, loader)
+        width, height = self._texture.get_size()
+        size = formations.Size(width, height)
+        self.set_content(formations.Content(size, self._texture.get_texture_id()))
+
+    def resize(self, size: formations.Size) -> bool:
+        resized = super().resize(size)
+        if resized:
+            self._texture.show_at(size.width, size.height)
+        return resized
 
 
 class InventoryLabel(formations_images.Label):
@@ -90,8 +143,8 @@ class HandFormation(formations.Formation):
     def __init__(self) -> None:
         super().__init__()
 
-    def set_image(self, texture_id: int) -> None:
-        content = formations.Content(_INVENTORY_IMAGE_SIZE, texture_id)
+    def set_image(self, region: media.TextureRegion) -> None:
+        content = formations.Content(_INVENTORY_IMAGE_SIZE, region.texture_id, uv=region.uv)
         self.set_content(content)
 
 
@@ -124,8 +177,8 @@ class PocketFormation(formations.Clasp):
         self.add(self._id_label, id_constraint)
         self.add(self._volume_label, volume_constraint)
 
-    def set_image_and_volume(self, texture_id: int, quantity_label: str) -> None:
-        content = formations.Content(_INVENTORY_IMAGE_SIZE, texture_id)
+    def set_image_and_volume(self, region: media.TextureRegion, quantity_label: str) -> None:
+        content = formations.Content(_INVENTORY_IMAGE_SIZE, region.texture_id, uv=region.uv)
         self.set_content(content)
         self._volume_label.set_text(quantity_label)
 
@@ -230,15 +283,91 @@ class StatsFormation(formations.Lineup):
         self.hunger.set_text(self._format_hunger(stats.hunger))
 
 
+class ProfilerLabel(formations_images.Label):
+    MARGIN = 5
+    PADDING = 5
+    BG_COLOR = formations.Color(0.0, 0.0, 0.0, 0.6)
+    FG_COLOR = formations.Color(1.0, 1.0, 1.0, 1.0)
+    FONT_SIZE = 12
+    FONT = "DejaVuSansMono.ttf"
+    LINE_SPACING = text.LINE_SPACING
+
+    def __init__(self) -> None:
+        super().__init__(
+            margin=self.MARGIN,
+            padding=self.PADDING,
+            bg_color=self.BG_COLOR,
+            fg_color=self.FG_COLOR,
+            font_size=self.FONT_SIZE,
+        )
+
+    def get_text(self) -> str:
+        return self._text
+
+    def get_line_count(self) -> int:
+        return self._text.count("\n") + 1
+
+    def calc_pref_width(self, height: float) -> float:
+        text_width = max(self._measure_text(line) for line in self._text.split("\n"))
+        return text_width + 2 * (self._margin + self._padding)
+
+    def calc_pref_height(self, width: float) -> float:
+        lines = self.get_line_count()
+        line_height = self._get_line_height() + self.LINE_SPACING
+        return lines * line_height + 2 * (self._margin + self._padding)
+
+
+class ProfilerFormation(formations.Clasp):
+    """Shows percentiles of frame phases measured by the profiler."""
+
+    UPDATE_INTERVAL = 0.5
+
+    def __init__(self, profiler: profiling.Profiler) -> None:
+        from .formations import Expanse, Gravity, Orientation
+
+        super().__init__()
+        self._profiler = profiler
+        self._update_time = -math.inf
+        self._label = ProfilerLabel()
+
+        constraint = self.Constraint(
+            orientation=Orientation.VERTICAL,
+            stretch=0.3,
+            expanse=Expanse.FIT,
+            horizontal_gravity=Gravity.START,
+            vertical_gravity=Gravity.CENTER,
+        )
+        self.add(self._label, constraint)
+
+    def update(self) -> None:
+        now = time.monotonic()
+        if now < self._update_time + self.UPDATE_INTERVAL:
+            return
+        self._update_time = now
+
+        summary = self._profiler.format_summary()
+        if summary == self._label.get_text():
+            return
+
+        line_count = self._label.get_line_count()
+        self._label.set_text(summary)
+        if self._label.get_line_count() != line_count:
+            self.mark_as_needs_reallocation()
+
+
 class MainFormation(formations.Clasp):
     def __init__(
-        self, tex_inventory: media.Textures, proxy: proxy.Proxy, resource_dir: str
+        self,
+        tex_inventory: media.Textures,
+        proxy: proxy.Proxy,
+        resource_dir: str,
+        loader: Optional[assets.AssetLoader] = None,
     ) -> None:
         from .formations import Expanse, Gravity, Orientation
 
         super().__init__()
 
-        self._map_formation = MapFormation(resource_dir)
+        self._map_formation = MapFormation(resource_dir, loader)
         self._stats_formation = StatsFormation()
         self._inventory_formation = InventoryFormation(tex_inventory, proxy)
 
@@ -341,9 +470,9 @@ class CraftItemFormation(formations.Lineup):
         self._space = space
         self._data = data
 
+        region = space._tex_inventory[item.essence.get_image_name()]
         self._image = formations_images.ImageFormation(
-            _INVENTORY_IMAGE_SIZE,
-            space._tex_inventory[item.essence.get_image_name()],
+            _INVENTORY_IMAGE_SIZE, region.texture_id, region.uv
         )
 
         self._label = CraftLabel(
@@ -575,7 +704,8 @@ class RecipeTabFormation(formations.Formation):
         self._recipe = recipe
         self._space = space
 
-        content = formations.Content(_INVENTORY_IMAGE_SIZE, tex[recipe.get_codename()])
+        region = tex[recipe.get_codename()]
+        content = formations.Content(_INVENTORY_IMAGE_SIZE, region.texture_id, uv=region.uv)
         self.set_content(content)
 
     def on_grab(self, position: formations.Position, *args) -> formations.EventResult:
@@ -628,19 +758,64 @@ class CraftingFormation(formations.Lineup):
 
 
 class Gui(formations.Stack):
+    # Resizes coming within this many seconds from the previous one are considered a part of
+    # a live resize, during which re-rasterizing contents is deferred.
+    RESIZE_SETTLE_DELAY = 0.25
+
+    # Overlays with a background at least this opaque hide the world well enough to let it be
+    # rendered at reduced rate and resolution.
+    COVERING_ALPHA = 0.85
+
     def __init__(
-        self, world: ear.WorldExpositor, scene: ear.Scene, proxy: proxy.Proxy, resource_dir: str
+        self,
+        world: ear.WorldExpositor,
+        scene: ear.Scene,
+        proxy: proxy.Proxy,
+        resource_dir: str,
+        options: options.Options,
+        registry: programs.ProgramRegistry,
+        profiler: profiling.Profiler,
+        loader: Optional[assets.AssetLoader] = None,
     ) -> None:
         super().__init__()
 
         self._world = world
-        self._formation_group = formations_renderer.FormationGroup()
+        self._profiler = profiler
+        self._loader = loader
+        self._gl_state = glstate.GlState()
+
+        # Has to be selected before any label gets created.
+        self._text_engine = text.TextEngine() if options.sdf_text else None
+        formations_images.Label.use_text_engine(self._text_engine)
+        self._label_cache: Optional[formations_images.LabelTextureCache] = None
+        if options.label_cache_mb is not None:
+            budget = int(options.label_cache_mb * 2**20)
+            self._label_cache = formations_images.LabelTextureCache(budget)
+            gpu_resources.RESOURCES.add_evictor(self._label_cache.evict)
+        formations_images.Label.use_texture_cache(self._label_cache)
+
+        # Frames never come faster than the frame rate cap, so the target must not exceed it.
+        target_fps = min(options.target_fps, options.max_fps or options.target_fps)
+        self._scaler = pacing.ResolutionScaler(
+            options.world_scale_min, options.world_scale_max, target_fps
+        )
+        self._world_group = formations_renderer.FormationGroup(
+            options.instanced_rendering, self._gl_state, registry=registry
+        )
+        self._overlay_group = formations_renderer.CachedFormationGroup(
+            options.instanced_rendering, self._gl_state, registry
+        )
         self._inventory = inventory.Inventory()
+        self._requested_size: Optional[formations.Size] = None
+        self._resize_time = -math.inf
+        self._is_resizing_live = False
 
-        self._tex_inventory = media.load_inventory_textures(resource_dir)
+        self._tex_inventory = media.load_inventory_textures(resource_dir, loader)
 
-        self._world_formation = WorldFormation(world, scene, proxy, resource_dir)
-        self._main_formation = MainFormation(self._tex_inventory, proxy, resource_dir)
+        self._world_formation = WorldFormation(
+            world, scene, proxy, resource_dir, self._gl_state, self._scaler
+        )
+        self._main_formation = MainFormation(self._tex_inventory, proxy, resource_dir, loader)
         self._crafting_formation = CraftingFormation(
             self._inventory, self._tex_inventory, proxy, self
         )
@@ -651,6 +826,11 @@ class Gui(formations.Stack):
         self.add(self._main_formation)
         self.add(self._crafting_formation)
 
+        self._profiler_formation: Optional[ProfilerFormation] = None
+        if options.profile_overlay:
+            self._profiler_formation = ProfilerFormation(profiler)
+            self.add(self._profiler_formation)
+
     def set_stats(self, stats: defs.Stats) -> None:
         self._main_formation.set_stats(stats)
 
@@ -663,9 +843,55 @@ class Gui(formations.Stack):
         self._main_formation.set_is_visible(not self._main_formation.get_is_visible())
         self._crafting_formation.set_is_visible(not self._crafting_formation.get_is_visible())
 
+    def dispose(self) -> None:
+        super().dispose()
+        if self._label_cache is not None:
+            gpu_resources.RESOURCES.remove_evictor(self._label_cache.evict)
+
+    def get_gl_state(self) -> glstate.GlState:
+        return self._gl_state
+
+    def get_render_stats(self) -> formations_renderer.RenderStats:
+        """Returns draw calls and texture binds issued by the last frame."""
+
+        stats = formations_renderer.RenderStats()
+        stats.add(self._world_group.get_stats())
+        stats.add(self._overlay_group.get_stats())
+        return stats
+
+    def get_label_cache_stats(self) -> Optional[Dict[str, int]]:
+        """Returns hits, misses and size of the label texture cache, if labels are cached."""
+
+        return self._label_cache.get_stats() if self._label_cache is not None else None
+
+    def is_dirty(self) -> bool:
+        """Tells if the formations have to be reallocated or updated in the next frame."""
+
+        # The profiler overlay changes with the measurements, which must not keep the frame rate
+        # from dropping while idle, so it is only refreshed together with frames drawn anyway.
+        needs_update = self._is_visible and (
+            self._needs_update
+            or any(c.needs_update() for c in self._children if c is not self._profiler_formation)
+        )
+        return (
+            self._requested_size is not None
+            or self._is_resizing_live
+            or self.needs_reallocation()
+            or needs_update
+            or (self._loader is not None and self._loader.is_loading())
+        )
+
+    def handle_frame_time(self, seconds: float) -> None:
+        if self._scaler.handle_frame_time(seconds):
+            self._world_formation.rescale()
+
     def handle_resize(self, width: float, height: float) -> None:
-        self.resize(formations.Size(width, height))
-        self._formation_group.resize(width, height)
+        # The window sets its own viewport on resize.
+        self._gl_state.invalidate()
+
+        # The window may be resized many times per frame while it is dragged, so only the last
+        # size gets applied in `draw`.
+        self._requested_size = formations.Size(width, height)
 
     def handle_button_press(self, x, y, button, modifiers) -> None:
         self.on_grab(formations.Position(x, y), button, modifiers)
@@ -677,9 +903,98 @@ class Gui(formations.Stack):
         pass
 
     def draw(self) -> None:
-        self.reallocate_if_needed()
-        if self.needs_update():
-            self._formation_group.set_plains(self.prepare_plains())
+        profiler = self._profiler
+        if self._profiler_formation is not None:
+            self._profiler_formation.update()
+
+        if self._loader is not None:
+            with profiler.phase("assets"):
+                # Loaded images only appear in the overlay, which has to be composed again.
+                if self._loader.upload():
+                    self._overlay_group.invalidate()
+
+        with profiler.phase("layout"):
+            self._apply_requested_size()
+            self.reallocate_if_needed()
+
+            # Covering changes the resolution of the world, so it has to be known before the plains
+            # pointing into its texture get prepared.
+            self._world_formation.set_is_covered(self._is_world_covered())
+
+        with profiler.phase("contents"):
+            now = time.monotonic()
+            if self._is_resizing_live and self._resize_time + self.RESIZE_SETTLE_DELAY < now:
+                self._is_resizing_live = False
+                self.refresh_contents()
+
+            needs_update = self.needs_update()
+            if needs_update and not self._is_resizing_live:
+                self.refresh_contents()
+
+        if needs_update:
+            with profiler.phase("plains"):
+                world_plains, overlay_plains = self._prepare_plain_arrays()
+                self._world_group.set_plains(world_plains)
+                self._overlay_group.set_plains(overlay_plains)
+
+        with profiler.phase("world", gpu=True):
+            self._world_formation.draw()
+
+        with profiler.phase("composite", gpu=True):
+            self._world_group.render()
+            self._overlay_group.render()
+
+        with profiler.phase("resources"):
+            # Textures dropped during this frame are deleted only after it stopped using them.
+            gpu_resources.RESOURCES.collect()
+
+    def _apply_requested_size(self) -> None:
+        if self._requested_size is None:
+            return
+
+        now = time.monotonic()
+        self._is_resizing_live = now < self._resize_time + self.RESIZE_SETTLE_DELAY
+        self._resize_time = now
+
+        size, self._requested_size = self._requested_size, None
+        self.resize(size)
+        self._world_group.resize(size.width, size.height)
+        self._overlay_group.resize(size.width, size.height)
+
+    def _prepare_plain_arrays(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Prepares plains of the world separately from plains of the overlay, which only has to be
+        composed again when it changes.
+        """
+
+        x, y = self._position.x, self._position.y
+        world_records: List[formations.PlainRecord] = list()
+        overlay_records: List[formations.PlainRecord] = list()
+        for child in self._children:
+            records = world_records if child is self._world_formation else overlay_records
+            child.collect_plain_records(x, y, records)
+
+        self._needs_update = False
+        return (
+            formations.records_to_array(world_records),
+            formations.records_to_array(overlay_records),
+        )
 
-        self._world_formation.draw()
-        self._formation_group.render()
+    def _is_world_covered(self) -> bool:
+        # All children of the stack start at its origin, so comparing sizes is enough.
+        world_size = self._world_formation.get_size()
+        for child in self._children:
+            if child is self._world_formation or not child.get_is_visible():
+                continue
+
+            content, size = child.get_content(), child.get_size()
+            color = content.get_color() if content is not None else None
+            if (
+                color is not None
+                and color.a >= self.COVERING_ALPHA
+                and size.width >= world_size.width
+                and size.height >= world_size.height
+            ):
+                return True
+
+        return False
@@ -1,9 +1,13 @@
-import os
+import concurrent.futures, functools, os
+import numpy
 import pyglet
 
 from OpenGL import GL
+from PIL import Image
 
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import assets, formations, gpu_resources, graphics
 
 DIR_SOUNDS: str = "effects"
 DIR_INVENTORY: str = "inventory"
@@ -21,60 +25,159 @@ IMAGE_NAMES_INVENTORY: List[str] = [
 ]
 
 
-def _load_texture(file_path: str) -> int:
-    image = pyglet.image.load(file_path)
-    texture = GL.glGenTextures(1)
-    GL.glBindTexture(GL.GL_TEXTURE_2D, texture)
-    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-    GL.glTexImage2D(
-        GL.GL_TEXTURE_2D,
-        0,
-        GL.GL_RGBA,
-        image.width,
-        image.height,
-        0,
-        GL.GL_RGBA,
-        GL.GL_UNSIGNED_BYTE,
-        image.get_data(),
-    )
-    return texture
+# Positions of images in an atlas page by name.
+_Placements = Dict[str, Tuple[int, int]]
+
+
+class TextureRegion:
+    """Part of a texture given by its texture coordinates."""
+
+    def __init__(self, texture_id: int, uv: formations.UvRect = formations.FULL_UV) -> None:
+        self.texture_id = texture_id
+        self.uv = uv
+
+    def __repr__(self) -> str:
+        return f"TextureRegion(texture: {self.texture_id}, uv: {self.uv})"
+
+
+class IconAtlas:
+    """
+    Images packed into as few textures as possible, so that drawing many of them needs no texture
+    switches. Images are packed in shelves, surrounded by a border of copies of their edge pixels
+    which keeps linear filtering from mixing in neighbours. Rows go bottom first, as pyglet used to
+    load them.
+    """
+
+    MAX_SIZE = 2048
+    BORDER = 1
+
+    def __init__(self, paths: Dict[str, str], loader: Optional[assets.AssetLoader] = None) -> None:
+        # Only headers are read to pack the images; pixels are decoded when composing pages.
+        sizes = dict()
+        for name, path in paths.items():
+            with Image.open(path) as image:
+                sizes[name] = image.size
+
+        self._regions: Dict[str, TextureRegion] = dict()
+        self._texture_ids: List[int] = list()
+        for placements in self._pack(sizes):
+            page_size = self._get_page_size(placements, sizes)
+            compose = functools.partial(_compose_page, page_size, placements, paths, self.BORDER)
+            if loader is not None:
+                # Pages are named after their images, which also decide the packing.
+                sources = [paths[name] for name in placements]
+                key = "atlas:" + ",".join(sources)
+                texture_id = loader.create_texture(compose, True, key, sources)
+            else:
+                texture_id = GL.glGenTextures(1)
+                gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, texture_id, "images")
+                graphics.upload_image(texture_id, compose(), bottom_up=True)
+
+            self._texture_ids.append(texture_id)
+            page_width, page_height = page_size
+            for name, (x, y) in placements.items():
+                width, height = sizes[name]
+                uv = (
+                    x / page_width,
+                    (page_height - y - height) / page_height,
+                    (x + width) / page_width,
+                    (page_height - y) / page_height,
+                )
+                self._regions[name] = TextureRegion(texture_id, uv)
+
+    def get_regions(self) -> Dict[str, TextureRegion]:
+        return self._regions
+
+    def _pack(self, sizes: Dict[str, Tuple[int, int]]) -> List[_Placements]:
+        pages: List[_Placements] = [dict()]
+        x, y, shelf_height = 0, 0, 0
+        for name in sorted(sizes, key=lambda name: sizes[name][1], reverse=True):
+            width, height = (extent + 2 * self.BORDER for extent in sizes[name])
+            if x + width > self.MAX_SIZE:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            if y + height > self.MAX_SIZE and len(pages[-1]) > 0:
+                pages.append(dict())
+                x, y, shelf_height = 0, 0, 0
+
+            pages[-1][name] = (x + self.BORDER, y + self.BORDER)
+            x += width
+            shelf_height = max(shelf_height, height)
+        return pages
+
+    def _get_page_size(
+        self, placements: _Placements, sizes: Dict[str, Tuple[int, int]]
+    ) -> Tuple[int, int]:
+        width = max(x + sizes[name][0] + self.BORDER for name, (x, y) in placements.items())
+        height = max(y + sizes[name][1] + self.BORDER for name, (x, y) in placements.items())
+        return width, height
+
+    def __repr__(self) -> str:
+        return f"IconAtlas(images: {len(self._regions)}, textures: {len(self._texture_ids)})"
 
 
 class Textures:
-    def __init__(self, image_names: Iterable[str], dir: str) -> None:
-        self._images = {
-            image_name: self._load_texture(dir, image_name) for image_name in image_names
-        }
+    """Images by name, packed into an `IconAtlas`."""
 
-    def change_texture(self, name: str, texture_id: int) -> None:
-        self._images[name] = texture_id
+    def __init__(
+        self, image_names: Iterable[str], dir: str, loader: Optional[assets.AssetLoader] = None
+    ) -> None:
+        paths = {image_name: os.path.join(dir, f"{image_name}.png") for image_name in image_names}
+        self._atlas = IconAtlas(paths, loader)
+        self._images = dict(self._atlas.get_regions())
 
-    def _load_texture(self, dir_name: str, image_name: str) -> int:
-        return _load_texture(os.path.join(dir_name, f"{image_name}.png"))
+    def change_texture(self, name: str, texture_id: int) -> None:
+        self._images[name] = TextureRegion(texture_id)
 
-    def __getitem__(self, key) -> int:
+    def __getitem__(self, key) -> TextureRegion:
         return self._images[key]
 
-    def __getattr__(self, key) -> int:
+    def __getattr__(self, key) -> TextureRegion:
         return self._images[key]
 
 
 class Sounds:
-    def __init__(self, resource_dir: str) -> None:
+    """Sounds by name. With a loader, sounds are decoded in the background and skipped until then."""
+
+    def __init__(self, resource_dir: str, loader: Optional[assets.AssetLoader] = None) -> None:
         self._sounds: Dict[str, pyglet.media.Player] = dict()
-        self._load(os.path.join(resource_dir, DIR_SOUNDS))
+        self._loading: Dict[str, "concurrent.futures.Future[pyglet.media.Source]"] = dict()
+        self._load(os.path.join(resource_dir, DIR_SOUNDS), loader)
 
-    def _load(self, dir: str) -> None:
+    def _load(self, dir: str, loader: Optional[assets.AssetLoader]) -> None:
         for item in os.listdir(dir):
             path = os.path.join(dir, item)
             if os.path.isfile(path) and item.endswith(".mp3"):
-                self._sounds[item[:-4]] = pyglet.media.load(path, streaming=False)
+                if loader is not None:
+                    self._loading[item[:-4]] = loader.load_sound(path)
+                else:
+                    self._sounds[item[:-4]] = pyglet.media.load(path, streaming=False)
 
     def play(self, sound_name: str) -> None:
+        loading = self._loading.get(sound_name)
+        if loading is not None and loading.done():
+            del self._loading[sound_name]
+            try:
+                self._sounds[sound_name] = loading.result()
+            except Exception as error:
+                print(f"Failed to load sound '{sound_name}': {error}")
+
         if sound_name in self._sounds:
             self._sounds[sound_name].play()
 
 
-def load_inventory_textures(resource_dir: str) -> Textures:
-    return Textures(IMAGE_NAMES_INVENTORY, os.path.join(resource_dir, DIR_INVENTORY))
+def load_inventory_textures(
+    resource_dir: str, loader: Optional[assets.AssetLoader] = None
+) -> Textures:
+    return Textures(IMAGE_NAMES_INVENTORY, os.path.join(resource_dir, DIR_INVENTORY), loader)
+
+
+def _compose_page(
+    size: Tuple[int, int], placements: _Placements, paths: Dict[str, str], border: int
+) -> Image.Image:
+    page = Image.new("RGBA", size, (0, 0, 0, 0))
+    for name, (x, y) in placements.items():
+        with Image.open(paths[name]) as image:
+            pixels = numpy.asarray(image.convert("RGBA"))
+        bordered = numpy.pad(pixels, ((border, border), (border, border), (0, 0)), mode="edge")
+        page.paste(Image.fromarray(bordered, "RGBA"), (x - border, y - border))
+    return page
@@ -0,0 +1,223 @@
+import functools, math, os, threading
+
+import numpy
+
+from OpenGL import GL
+from PIL import Image
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import assets, gpu_resources, graphics
+
+
+def get_level_count(width: int, height: int) -> int:
+    """Returns the number of levels down to and including the one of a single pixel."""
+
+    return max(width, height).bit_length()
+
+
+def get_level_size(width: int, height: int, level: int) -> Tuple[int, int]:
+    return max(1, width >> level), max(1, height >> level)
+
+
+def get_level_path(path: str, level: int) -> str:
+    """Returns the path of the file keeping a level generated ahead of time, like `map.mip3.png`."""
+
+    root, extension = os.path.splitext(path)
+    return f"{root}.mip{level}{extension}"
+
+
+def find_level_file(path: str, level: int) -> Optional[str]:
+    """Returns the file of a level generated ahead of time, unless it is missing or outdated."""
+
+    level_path = get_level_path(path, level)
+    if level == 0 or not os.path.exists(level_path):
+        return None
+    if os.path.getmtime(level_path) < os.path.getmtime(path):
+        return None
+    return level_path
+
+
+class _LevelSource:
+    """
+    Levels of an image, each computed from the previous one with a box filter, so that the image is
+    decoded once for all levels requested together. May be used from any thread.
+    """
+
+    def __init__(self, path: str, use_level_files: bool = True) -> None:
+        self._path = path
+        self._use_level_files = use_level_files
+        self._lock = threading.Lock()
+        self._levels: Dict[int, Image.Image] = dict()
+
+    def get_sources(self, level: int) -> List[str]:
+        level_path = find_level_file(self._path, level) if self._use_level_files else None
+        return [level_path or self._path]
+
+    def make_level(self, level: int) -> Image.Image:
+        level_path = find_level_file(self._path, level) if self._use_level_files else None
+        if level_path is not None:
+            with Image.open(level_path) as image:
+                return image.convert("RGBA")
+
+        with self._lock:
+            if 0 not in self._levels:
+                with Image.open(self._path) as image:
+                    self._levels[0] = image.convert("RGBA")
+
+            width, height = self._levels[0].size
+            sharper = max(known for known in self._levels.keys() if known <= level)
+            image = self._levels[sharper]
+            for next_level in range(sharper + 1, level + 1):
+                image = image.resize(get_level_size(width, height, next_level), Image.BOX)
+                self._levels[next_level] = image
+            return image
+
+
+class MipMappedTexture:
+    """
+    Texture of an image file with mipmaps, of which only the levels needed to draw the image at its
+    size on screen are kept. Sharper levels are loaded when the image grows on screen and dropped
+    when it shrinks again.
+
+    With a loader, levels are decoded in the background and become visible one by one, coarse ones
+    first. Until then the single pixel of the coarsest level shows the placeholder color.
+    """
+
+    PLACEHOLDER_COLOR = assets.AssetLoader.PLACEHOLDER_COLOR
+
+    # Levels sharper than needed are dropped only when more than this many of them are kept, so
+    # that small changes of size do not load and drop the same level again and again.
+    SPARE_LEVELS = 1
+
+    def __init__(self, path: str, loader: Optional[assets.AssetLoader] = None) -> None:
+        self._path = path
+        self._loader = loader
+
+        with Image.open(path) as image:
+            self._size = image.size
+
+        self._coarsest = get_level_count(*self._size) - 1
+        self._sharpest_wanted = self._coarsest + 1
+        self._resident: Set[int] = set()
+        self._requested: Set[int] = set()
+
+        self._texture_id = GL.glGenTextures(1)
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, self._texture_id, "images")
+        placeholder = numpy.array(self.PLACEHOLDER_COLOR, dtype=numpy.uint8)
+        graphics.allocate_texture(self._texture_id, 1, 1, self._coarsest)
+        graphics.upload_pixels(self._texture_id, 0, 0, 1, 1, placeholder, self._coarsest)
+        self._apply_levels()
+
+    def get_texture_id(self) -> int:
+        return self._texture_id
+
+    def get_size(self) -> Tuple[int, int]:
+        """Returns the size of the image at full resolution."""
+
+        return self._size
+
+    def get_resident_levels(self) -> List[int]:
+        return sorted(self._resident)
+
+    def show_at(self, width: float, height: float) -> None:
+        """Loads or drops levels to draw the image at the given size in pixels."""
+
+        if width < 1.0 or height < 1.0:
+            return
+
+        # The sharpest level not smaller than the image on screen, as trilinear filtering uses it
+        # together with the next coarser one.
+        scale = max(self._size[0] / width, self._size[1] / height)
+        needed = 0 if scale <= 1.0 else min(int(math.log2(scale)), self._coarsest)
+
+        if needed < self._sharpest_wanted:
+            previous, self._sharpest_wanted = self._sharpest_wanted, needed
+            self._request(range(previous - 1, needed - 1, -1))
+        elif needed - self.SPARE_LEVELS > self._sharpest_wanted:
+            self._sharpest_wanted = needed - self.SPARE_LEVELS
+            dropped = [level for level in self._resident if level < self._sharpest_wanted]
+            self._resident.difference_update(dropped)
+            for level in dropped:
+                self._free_level(level)
+            self._apply_levels()
+
+    def _request(self, levels: Iterable[int]) -> None:
+        # Levels go coarse first, so that something close to the image is visible soon.
+        levels = [level for level in levels if level not in self._requested]
+        source = _LevelSource(self._path)
+        for level in levels:
+            self._requested.add(level)
+            make_image = functools.partial(source.make_level, level)
+            on_loaded = functools.partial(self._handle_loaded, level)
+            if self._loader is not None:
+                self._loader.load_level(
+                    self._texture_id,
+                    level,
+                    make_image,
+                    name=f"{self._path}:mip{level}",
+                    sources=source.get_sources(level),
+                    on_loaded=on_loaded,
+                )
+            else:
+                pixels = numpy.asarray(make_image())
+                height, width = pixels.shape[:2]
+                graphics.allocate_texture(self._texture_id, width, height, level)
+                graphics.upload_pixels(self._texture_id, 0, 0, width, height, pixels, level)
+                on_loaded()
+
+    def _handle_loaded(self, level: int) -> None:
+        self._requested.discard(level)
+        if level < self._sharpest_wanted:
+            # The image shrank while the level was loading.
+            self._free_level(level)
+            return
+
+        self._resident.add(level)
+        self._apply_levels()
+
+    def _free_level(self, level: int) -> None:
+        # Storage of no pixels replaces the level, which is never the coarsest one.
+        graphics.allocate_texture(self._texture_id, 0, 0, level)
+
+    def _apply_levels(self) -> None:
+        # Only a run of levels down from the coarsest, which always has storage, can be sampled.
+        base_level = self._coarsest
+        while base_level - 1 in self._resident:
+            base_level -= 1
+
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BASE_LEVEL, base_level)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, self._coarsest)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+        image_width, image_height = self._size
+        levels = self._resident | {self._coarsest}
+        sizes = [get_level_size(image_width, image_height, level) for level in levels]
+        size = sum(4 * width * height for width, height in sizes)
+        gpu_resources.RESOURCES.set_size(gpu_resources.TEXTURE, self._texture_id, size)
+
+    def __repr__(self) -> str:
+        return (
+            f"MipMappedTexture(size: {self._size[0]}x{self._size[1]}, "
+            f"resident: {self.get_resident_levels()}, loading: {sorted(self._requested)})"
+        )
+
+
+def generate_level_files(path: str) -> List[str]:
+    """Writes all levels of the image but the full one next to it. Returns their paths."""
+
+    with Image.open(path) as image:
+        level_count = get_level_count(*image.size)
+
+    source = _LevelSource(path, use_level_files=False)
+    level_paths = list()
+    for level in range(1, level_count):
+        level_path = get_level_path(path, level)
+        source.make_level(level).save(level_path)
+        level_paths.append(level_path)
+    return level_paths
@@ -60,6 +60,10 @@ class Motive(abc.ABC):
         else:
             context.world.remove_highlight()
 
+    def __repr__(self) -> str:
+        actor_id = self.get_actor_id()
+        return type(self).__name__ if actor_id is None else f"{type(self).__name__}({actor_id})"
+
 
 class ActorCreationMotive(Motive):
     def __init__(self, action: actions.ActorCreationAction) -> None:
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+
+from typing import Optional, Tuple
+
+
+@dataclass
+class Options:
+    """Startup options of the client."""
+
+    # Render formations as instances of a single quad instead of generating vertices for each plain.
+    instanced_rendering: bool = False
+
+    # Draw labels as quads of glyphs from shared distance field atlases instead of rasterizing them.
+    sdf_text: bool = False
+
+    # Memory in megabytes for textures of rasterized labels kept for reuse, `None` to not share
+    # label textures at all. Has no effect with `sdf_text`.
+    label_cache_mb: Optional[float] = 16.0
+
+    # Megabytes of textures and buffers above which unused cached textures are evicted, `None` for
+    # no limit.
+    gpu_budget_mb: Optional[float] = 512.0
+
+    # Call hot OpenGL functions directly through `ctypes` without PyOpenGL's error checking.
+    fast_gl: bool = False
+
+    # Upload texture pixels through a ring of pixel buffer objects instead of from client memory.
+    pixel_buffer_uploads: bool = False
+
+    # Seconds per frame spent uploading images decoded in the background.
+    asset_upload_budget: float = 0.004
+
+    # Maximal number of frames per second while anything changes, `None` for no limit.
+    max_fps: Optional[float] = None
+
+    # Number of frames per second while nothing changes, `None` to never slow down.
+    idle_fps: Optional[float] = 10.0
+
+    # Synchronize buffer swaps with the vertical refresh of the display.
+    vsync: bool = True
+
+    # Bounds of the world rendering resolution relative to the window size. The scale is adjusted
+    # between them to keep `target_fps`, or fixed if they are equal.
+    world_scale_min: float = 1.0
+    world_scale_max: float = 1.0
+
+    # Frame rate the world resolution scaling tries to keep.
+    target_fps: float = 60.0
+
+    # Directory for caching linked shader program binaries, `None` to always compile shaders.
+    shader_cache_dir: Optional[str] = None
+
+    # File keeping decoded images and sounds between launches, `None` to always decode them.
+    resource_bundle: Optional[str] = None
+
+    # Measure phases of frames. The profile is shown on screen with `profile_overlay` and written
+    # periodically to `profile_dump` as JSON; either of them enables profiling.
+    profile: bool = False
+    profile_overlay: bool = False
+    profile_dump: Optional[str] = None
+
+    # Frames taking longer than `slow_frame_budget` seconds are saved to `slow_frame_dir` together
+    # with stacks of all threads sampled while they were running.
+    slow_frame_budget: Optional[float] = None
+    slow_frame_dir: str = "slow_frames"
+
+    # Size of the window; the window is maximized if not given.
+    window_size: Optional[Tuple[int, int]] = None
+
+    # Messages received from the server are written to `record_path` for replaying in benchmarks.
+    record_path: Optional[str] = None
+
+    # Runs the headless benchmark for this many frames instead of connecting to a server.
+    benchmark_frames: Optional[int] = None
@@ -0,0 +1,158 @@
+import math, time
+
+import pyglet
+
+from typing import Optional
+
+
+def _redraw(dt: float) -> None:
+    # Any scheduled call makes the event loop redraw all windows, so there is nothing to do here.
+    pass
+
+
+class FramePacer(pyglet.event.EventDispatcher):
+    """
+    Decides how often the window gets redrawn.
+
+    While something is changing, frames are rendered at most `max_fps` times per second (or as
+    often as possible if it is `None`). When nothing changed for `idle_delay` seconds, the pacer
+    switches to the idle mode and renders only `idle_fps` frames per second (never idles if it is
+    `None`). `wake` switches back immediately and may be called from any thread.
+    """
+
+    IDLE_DELAY = 1.0
+
+    def __init__(
+        self,
+        max_fps: Optional[float],
+        idle_fps: Optional[float],
+        idle_delay: float = IDLE_DELAY,
+    ) -> None:
+        super().__init__()
+        self._max_fps = max_fps
+        self._idle_fps = idle_fps
+        self._idle_delay = idle_delay
+        self._is_idle = False
+        self._last_busy = time.monotonic()
+        self._schedule(self._max_fps)
+
+    def is_idle(self) -> bool:
+        return self._is_idle
+
+    def wake(self) -> None:
+        """Leaves the idle mode as soon as the event loop handles the posted event."""
+
+        pyglet.app.platform_event_loop.post_event(self, "on_wake")
+
+    def handle_frame(self, busy: bool) -> None:
+        """Updates the mode after a frame. `busy` tells if anything was changing in the frame."""
+
+        now = time.monotonic()
+        if busy:
+            self._last_busy = now
+            self._activate()
+        elif not self._is_idle and self._idle_fps and self._last_busy + self._idle_delay < now:
+            self._is_idle = True
+            self._schedule(self._idle_fps)
+
+    def on_wake(self) -> None:
+        self._last_busy = time.monotonic()
+        if self._is_idle:
+            self._activate()
+            pyglet.clock.schedule_once(_redraw, 0.0)
+
+    def _activate(self) -> None:
+        if self._is_idle:
+            self._is_idle = False
+            self._schedule(self._max_fps)
+
+    def _schedule(self, fps: Optional[float]) -> None:
+        pyglet.clock.unschedule(_redraw)
+        if fps:
+            pyglet.clock.schedule_interval(_redraw, 1.0 / fps)
+        else:
+            pyglet.clock.schedule(_redraw)
+
+    def __repr__(self) -> str:
+        mode = "idle" if self._is_idle else "active"
+        return f"FramePacer({mode}, max: {self._max_fps}, idle: {self._idle_fps})"
+
+
+FramePacer.register_event_type("on_wake")
+
+
+class ResolutionScaler:
+    """
+    Chooses the scale of the world rendering resolution relative to the window size, so that frames
+    take about `1 / target_fps` seconds. The scale drops quickly when frames take too long and rises
+    slowly, step by step, while frames keep meeting the target. It always stays between `min_scale`
+    and `max_scale`.
+    """
+
+    SMOOTHING = 0.1
+    GRANULARITY = 0.05
+    LOWER_THRESHOLD = 1.15
+    RAISE_THRESHOLD = 1.05
+    RAISE_FRAMES = 120
+    COOLDOWN_FRAMES = 30
+
+    def __init__(self, min_scale: float, max_scale: float, target_fps: float) -> None:
+        assert 0.0 < min_scale <= max_scale, "Invalid resolution scale bounds"
+        self._min_scale = min_scale
+        self._max_scale = max_scale
+        self._target = 1.0 / target_fps
+        self._scale = max_scale
+        self._average: Optional[float] = None
+        self._good_frames = 0
+        self._cooldown = 0
+
+    def get_scale(self) -> float:
+        return self._scale
+
+    def is_dynamic(self) -> bool:
+        return self._min_scale < self._max_scale
+
+    def handle_frame_time(self, seconds: float) -> bool:
+        """Accounts for one frame rendered at the full rate. Returns `True` if the scale changed."""
+
+        if not self.is_dynamic():
+            return False
+
+        if self._average is None:
+            self._average = seconds
+        else:
+            self._average += self.SMOOTHING * (seconds - self._average)
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return False
+
+        if self._average > self.LOWER_THRESHOLD * self._target:
+            # Rendering cost is roughly proportional to the number of pixels.
+            self._good_frames = 0
+            scale = self._scale * math.sqrt(self._target / self._average)
+            return self._set_scale(math.floor(scale / self.GRANULARITY) * self.GRANULARITY)
+
+        elif self._average < self.RAISE_THRESHOLD * self._target:
+            self._good_frames += 1
+            if self._good_frames < self.RAISE_FRAMES:
+                return False
+            self._good_frames = 0
+            return self._set_scale(self._scale + 2 * self.GRANULARITY)
+
+        else:
+            self._good_frames = 0
+            return False
+
+    def _set_scale(self, scale: float) -> bool:
+        scale = min(max(scale, self._min_scale), self._max_scale)
+        if math.isclose(scale, self._scale):
+            return False
+
+        self._scale = scale
+        self._average = None
+        self._cooldown = self.COOLDOWN_FRAMES
+        return True
+
+    def __repr__(self) -> str:
+        return f"ResolutionScaler({self._scale:.2f}, {self._min_scale}..{self._max_scale})"
@@ -0,0 +1,390 @@
+import collections, ctypes, json, math, os, sys, threading, time
+
+import numpy
+
+from OpenGL import GL
+from OpenGL import error as gl_error
+from OpenGL.raw.GL.VERSION import GL_3_3
+
+from types import CodeType
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+PERCENTILES = (50, 95, 99)
+
+# GPU times longer than this are treated as driver glitches (some report garbage for first queries).
+_MAX_GPU_TIME = 1.0
+
+
+class _NullPhase:
+    """Phase scope of a disabled profiler. A single instance is shared to keep the cost minimal."""
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, type, value, traceback) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, profiler: "Profiler", name: str, gpu_timer: Optional["GpuTimer"]) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._gpu_timer = gpu_timer
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        if self._gpu_timer is not None and not self._gpu_timer.begin(self._name):
+            self._gpu_timer = None
+        self._start = time.perf_counter()
+
+    def __exit__(self, type, value, traceback) -> None:
+        self._profiler._add(self._name, time.perf_counter() - self._start)
+        if self._gpu_timer is not None:
+            self._gpu_timer.end()
+
+
+class GpuTimer:
+    """
+    Measures GPU time of scopes with timer queries. Results are collected only once available, a few
+    frames later, so that measuring never stalls the pipeline. Timer queries cannot be nested, so
+    a scope started while another one is active is not measured.
+    """
+
+    def __init__(self) -> None:
+        self._supported = self._check_support()
+        self._free: List[int] = list()
+        self._pending: Deque[Tuple[int, str, int]] = collections.deque()
+        self._active: Optional[Tuple[str, int]] = None
+        self._frame = 0
+        self._result = ctypes.c_uint64(0)
+
+    def is_supported(self) -> bool:
+        return self._supported
+
+    def set_frame(self, frame: int) -> None:
+        self._frame = frame
+
+    def begin(self, name: str) -> bool:
+        if not self._supported or self._active is not None:
+            return False
+
+        query = self._free.pop() if len(self._free) > 0 else int(GL.glGenQueries(1)[0])
+        GL.glBeginQuery(GL.GL_TIME_ELAPSED, query)
+        self._active = (name, query)
+        return True
+
+    def end(self) -> None:
+        assert self._active is not None
+        name, query = self._active
+        GL.glEndQuery(GL.GL_TIME_ELAPSED)
+        self._pending.append((self._frame, name, query))
+        self._active = None
+
+    def collect(self) -> List[Tuple[int, str, float]]:
+        """Returns frame numbers, names and durations of the scopes measured since last call."""
+
+        results = list()
+        while len(self._pending) > 0:
+            frame, name, query = self._pending[0]
+            if not GL.glGetQueryObjectiv(query, GL.GL_QUERY_RESULT_AVAILABLE):
+                break
+
+            # The 64-bit getter of PyOpenGL does not convert its output, so call the raw one.
+            GL_3_3.glGetQueryObjectui64v(query, GL.GL_QUERY_RESULT, ctypes.byref(self._result))
+            self._pending.popleft()
+            self._free.append(query)
+
+            seconds = 1e-9 * self._result.value
+            if seconds < _MAX_GPU_TIME:
+                results.append((frame, name, seconds))
+
+        return results
+
+    def _check_support(self) -> bool:
+        try:
+            return GL.glGetQueryiv(GL.GL_TIME_ELAPSED, GL.GL_QUERY_COUNTER_BITS) > 0
+        except (gl_error.GLError, gl_error.NullFunctionError):
+            return False
+
+
+class StackSampler:
+    """
+    Records stacks of all other threads every `interval` seconds in a background thread. Only the
+    last `capacity` samples are kept. A sample may come late while another thread holds the GIL,
+    so the samples show where time went rather than exact durations.
+    """
+
+    INTERVAL = 0.001
+    CAPACITY = 10000
+    MAX_DEPTH = 64
+
+    def __init__(self, interval: float = INTERVAL, capacity: int = CAPACITY) -> None:
+        self._interval = interval
+        self._samples: Deque[Tuple[float, int, Tuple[Tuple[CodeType, int], ...]]]
+        self._samples = collections.deque(maxlen=capacity)
+        self._event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._event.set()
+            self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._event.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collect(self, start: float, end: float) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the stacks sampled between `start` and `end` (`perf_counter` times) as thread names
+        mapped to collapsed stacks (outermost frame first, separated by `;`) and their counts.
+        """
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        result: Dict[str, Dict[str, int]] = dict()
+        # Copying a deque is atomic, while iterating it could race with the sampling thread.
+        for timestamp, thread_id, stack in list(self._samples):
+            if not start <= timestamp <= end:
+                continue
+            stacks = result.setdefault(names.get(thread_id, str(thread_id)), dict())
+            collapsed = ";".join(self._format_frame(code, line) for code, line in reversed(stack))
+            stacks[collapsed] = stacks.get(collapsed, 0) + 1
+        return result
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while self._event.is_set():
+            time.sleep(self._interval)
+            timestamp = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                # Frames are not stored, so that their locals are not kept alive.
+                stack: List[Tuple[CodeType, int]] = list()
+                current: Any = frame
+                while current is not None and len(stack) < self.MAX_DEPTH:
+                    stack.append((current.f_code, current.f_lineno))
+                    current = current.f_back
+                self._samples.append((timestamp, thread_id, tuple(stack)))
+            del frame
+
+    @staticmethod
+    def _format_frame(code: CodeType, line: int) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})"
+
+
+class Profiler:
+    """
+    Measures named phases of frames.
+
+    Durations of the last `capacity` frames are kept in a ring buffer, from which percentiles are
+    computed. Phases entered with `gpu=True` are also measured on the GPU (reported as `gpu:NAME`),
+    which requires a current OpenGL context. If `dump_path` is given, a summary is written there as
+    JSON every `dump_interval` seconds. A disabled profiler does no measurements and its phases cost
+    about as much as an empty `with` statement.
+
+    If `slow_frame_budget` (in seconds) is given, stacks of all threads are sampled in the
+    background and every frame taking longer than the budget is written to `capture_dir` together
+    with its phases, annotations (see `annotate`) and the stacks sampled while it was running.
+    """
+
+    CAPACITY = 600
+    DUMP_INTERVAL = 5.0
+    MAX_CAPTURES = 100
+
+    FRAME = "frame"
+    INTERVAL = "interval"
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        capacity: int = CAPACITY,
+        dump_path: Optional[str] = None,
+        dump_interval: float = DUMP_INTERVAL,
+        slow_frame_budget: Optional[float] = None,
+        capture_dir: str = ".",
+    ) -> None:
+        self._enabled = enabled
+        self._capacity = capacity
+        self._dump_path = dump_path
+        self._dump_interval = dump_interval
+        self._slow_frame_budget = slow_frame_budget
+        self._capture_dir = capture_dir
+        self._captures = 0
+        self._annotations: Dict[str, Any] = dict()
+
+        self._sampler: Optional[StackSampler] = None
+        if enabled and slow_frame_budget is not None:
+            self._sampler = StackSampler()
+            self._sampler.start()
+
+        self._samples: Dict[str, numpy.ndarray] = dict()
+        self._current: Dict[str, float] = dict()
+        self._frame = 0
+        self._frame_start: Optional[float] = None
+        self._prev_frame_start: Optional[float] = None
+        self._next_dump = time.monotonic() + dump_interval
+        self._gpu_timer: Optional[GpuTimer] = None
+
+    def is_enabled(self) -> bool:
+        return self._enabled
+
+    def get_frame_count(self) -> int:
+        return self._frame
+
+    def is_capturing(self) -> bool:
+        """Tells if slow frames are captured, i.e. if annotations are of any use."""
+
+        return self._sampler is not None
+
+    def annotate(self, key: str, value: Any) -> None:
+        """Attaches a JSON-serializable value to the current frame, in case it gets captured."""
+
+        if self._sampler is not None:
+            self._annotations[key] = value
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+    def phase(self, name: str, gpu: bool = False) -> Any:
+        """Returns a context manager measuring the enclosed code as the named phase."""
+
+        if not self._enabled:
+            return _NULL_PHASE
+        if gpu and self._gpu_timer is None:
+            self._gpu_timer = GpuTimer()
+        return _Phase(self, name, self._gpu_timer if gpu else None)
+
+    def begin_frame(self) -> None:
+        if not self._enabled:
+            return
+
+        now = time.perf_counter()
+        if self._prev_frame_start is not None:
+            self._current[self.INTERVAL] = now - self._prev_frame_start
+        self._frame_start = self._prev_frame_start = now
+
+        if self._gpu_timer is not None:
+            self._gpu_timer.set_frame(self._frame)
+
+    def end_frame(self) -> None:
+        if not self._enabled or self._frame_start is None:
+            return
+
+        frame_end = time.perf_counter()
+        self._current[self.FRAME] = frame_end - self._frame_start
+        if self._sampler is not None:
+            budget = self._slow_frame_budget
+            if budget is not None and self._current[self.FRAME] > budget:
+                self._capture(self._frame_start, frame_end)
+            self._annotations.clear()
+        self._frame_start = None
+
+        row = self._frame % self._capacity
+        for name in self._current.keys() - self._samples.keys():
+            self._samples[name] = numpy.full(self._capacity, math.nan)
+        for name, samples in self._samples.items():
+            samples[row] = self._current.get(name, math.nan)
+        self._current.clear()
+
+        if self._gpu_timer is not None:
+            for frame, name, seconds in self._gpu_timer.collect():
+                self._store(frame, f"gpu:{name}", seconds)
+
+        self._frame += 1
+
+        if self._dump_path is not None and time.monotonic() >= self._next_dump:
+            self._next_dump = time.monotonic() + self._dump_interval
+            self.dump(self._dump_path)
+
+    def summarize(self) -> Dict[str, Dict[str, float]]:
+        """Returns the mean and percentiles of every phase in milliseconds, slowest phases first."""
+
+        summary = dict()
+        for name, samples in self._samples.items():
+            valid = samples[~numpy.isnan(samples)]
+            if len(valid) == 0:
+                continue
+
+            values = 1000.0 * numpy.percentile(valid, PERCENTILES)
+            entry = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values)}
+            entry["mean"] = float(1000.0 * valid.mean())
+            entry["count"] = len(valid)
+            summary[name] = entry
+
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["p50"]))
+
+    def format_summary(self) -> str:
+        lines = [f"{'phase':<16} {'p50':>7} {'p95':>7} {'p99':>7}"]
+        for name, entry in self.summarize().items():
+            values = " ".join(f"{entry[f'p{p}']:>7.2f}" for p in PERCENTILES)
+            lines.append(f"{name:<16} {values}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """Writes the summary as JSON. The file is replaced at once, so readers never see it partial."""
+
+        data = {
+            "time": time.time(),
+            "frames": self._frame,
+            "capacity": self._capacity,
+            "unit": "ms",
+            "phases": self.summarize(),
+        }
+
+        temporary_path = f"{path}.tmp"
+        try:
+            with open(temporary_path, "w") as dump_file:
+                json.dump(data, dump_file, indent=2)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            print(f"Failed to dump profile: {e}")
+
+    def _capture(self, start: float, end: float) -> None:
+        if self._sampler is None or self._captures >= self.MAX_CAPTURES:
+            return
+        self._captures += 1
+
+        data = {
+            "time": time.time(),
+            "frame": self._frame,
+            "unit": "ms",
+            "budget": 1000.0 * (self._slow_frame_budget or 0.0),
+            "phases": {name: 1000.0 * seconds for name, seconds in self._current.items()},
+            "annotations": self._annotations,
+            "stacks": self._sampler.collect(start, end),
+        }
+
+        path = os.path.join(self._capture_dir, f"slow-frame-{self._frame:08d}.json")
+        try:
+            os.makedirs(self._capture_dir, exist_ok=True)
+            with open(path, "w") as capture_file:
+                json.dump(data, capture_file, indent=2)
+        except (OSError, TypeError) as e:
+            print(f"Failed to capture slow frame: {e}")
+
+    def _add(self, name: str, seconds: float) -> None:
+        self._current[name] = self._current.get(name, 0.0) + seconds
+
+    def _store(self, frame: int, name: str, seconds: float) -> None:
+        # Results of frames already dropped from the ring buffer are ignored.
+        if frame <= self._frame - self._capacity:
+            return
+
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = numpy.full(self._capacity, math.nan)
+        samples[frame % self._capacity] = seconds
+
+    def __repr__(self) -> str:
+        state = "enabled" if self._enabled else "disabled"
+        return f"Profiler({state}, frames: {self._frame}, phases: {len(self._samples)})"
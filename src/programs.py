@@ -0,0 +1,190 @@
+import ctypes, hashlib, os, struct
+
+from OpenGL import GL
+from OpenGL import error as gl_error
+from OpenGL.GL import shaders
+
+from typing import Dict, List, Optional, Tuple
+
+DIR_SHADERS: str = "shaders"
+
+# Shaders shipped next to the sources, used when the resource directory does not provide them.
+_FALLBACK_SHADER_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), DIR_SHADERS)
+
+# Cached binaries start with the binary format.
+_HEADER = struct.Struct("<I")
+
+# Program names mapped to the IDs of their vertex and fragment shaders.
+PROGRAMS: Dict[str, Tuple[str, str]] = {
+    "formations": ("formations", "formations"),
+    "formations_instanced": ("formations_instanced", "formations"),
+    "simple": ("simple", "simple"),
+}
+
+
+class ProgramRegistry:
+    """
+    Compiles the shader programs once and hands them out by name.
+
+    Shader sources are looked up in the `shaders` subdirectory of the resource directory and then
+    in the `shaders` directory of the sources. If `cache_dir` is given, linked program binaries are
+    stored there under a key derived from the driver and the sources, so later startups can skip
+    compilation. Binaries the driver rejects are removed and the program is compiled again.
+    """
+
+    def __init__(self, resource_dir: Optional[str] = None, cache_dir: Optional[str] = None) -> None:
+        self._shader_dirs: List[str] = list()
+        if resource_dir is not None:
+            self._shader_dirs.append(os.path.join(resource_dir, DIR_SHADERS))
+        self._shader_dirs.append(_FALLBACK_SHADER_DIR)
+
+        self._cache_dir = cache_dir
+        self._programs: Dict[str, int] = dict()
+
+        self.compiled = 0
+        self.loaded = 0
+        self.rejected = 0
+
+    def get(self, name: str) -> int:
+        """Returns the program of the given name, compiling it if not done yet."""
+
+        program = self._programs.get(name)
+        if program is None:
+            program = self._programs[name] = self._load(name)
+        return program
+
+    def compile_all(self) -> None:
+        """Prepares all known programs, e.g. at startup. Needs a current OpenGL context."""
+
+        for name in PROGRAMS:
+            self.get(name)
+
+    def _load(self, name: str) -> int:
+        vertex_id, fragment_id = PROGRAMS[name]
+        vertex_source = self._read_source(vertex_id, "vertex")
+        fragment_source = self._read_source(fragment_id, "fragment")
+
+        cache_path = self._get_cache_path(name, vertex_source, fragment_source)
+        if cache_path is not None:
+            program = self._load_binary(cache_path)
+            if program is not None:
+                self.loaded += 1
+                return program
+
+        program = self._compile(vertex_source, fragment_source, cache_path is not None)
+        self.compiled += 1
+        if cache_path is not None:
+            self._store_binary(program, cache_path)
+        return program
+
+    def _read_source(self, shader_id: str, kind: str) -> str:
+        file_name = f"{shader_id}_{kind}.glsl"
+        for shader_dir in self._shader_dirs:
+            file_path = os.path.join(shader_dir, file_name)
+            if os.path.isfile(file_path):
+                with open(file_path, "r") as shader_file:
+                    return shader_file.read()
+
+        raise FileNotFoundError(
+            f"Shader '{file_name}' not found in: {', '.join(self._shader_dirs)}"
+        )
+
+    def _compile(self, vertex_source: str, fragment_source: str, retrievable: bool) -> int:
+        vertex_shader = shaders.compileShader(vertex_source, GL.GL_VERTEX_SHADER)
+        fragment_shader = shaders.compileShader(fragment_source, GL.GL_FRAGMENT_SHADER)
+
+        program = GL.glCreateProgram()
+        GL.glAttachShader(program, vertex_shader)
+        GL.glAttachShader(program, fragment_shader)
+        if retrievable:
+            GL.glProgramParameteri(program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
+        GL.glLinkProgram(program)
+
+        GL.glDetachShader(program, vertex_shader)
+        GL.glDetachShader(program, fragment_shader)
+        GL.glDeleteShader(vertex_shader)
+        GL.glDeleteShader(fragment_shader)
+
+        if GL.glGetProgramiv(program, GL.GL_LINK_STATUS) != GL.GL_TRUE:
+            log = GL.glGetProgramInfoLog(program)
+            GL.glDeleteProgram(program)
+            raise RuntimeError(f"Linking shader program failed: {log!r}")
+
+        return program
+
+    def _get_cache_path(self, name: str, vertex_source: str, fragment_source: str) -> Optional[str]:
+        if self._cache_dir is None or GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS) < 1:
+            return None
+
+        key = hashlib.sha256()
+        for value in (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION):
+            key.update(GL.glGetString(value) or b"")
+            key.update(b"\0")
+        key.update(vertex_source.encode())
+        key.update(b"\0")
+        key.update(fragment_source.encode())
+        return os.path.join(self._cache_dir, f"{name}-{key.hexdigest()[:32]}.bin")
+
+    def _load_binary(self, cache_path: str) -> Optional[int]:
+        try:
+            with open(cache_path, "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+
+        if len(data) <= _HEADER.size:
+            self._reject(cache_path)
+            return None
+
+        (binary_format,) = _HEADER.unpack_from(data)
+        binary = data[_HEADER.size :]
+
+        program = GL.glCreateProgram()
+        try:
+            GL.glProgramBinary(program, binary_format, binary, len(binary))
+            linked = GL.glGetProgramiv(program, GL.GL_LINK_STATUS) == GL.GL_TRUE
+        except gl_error.GLError:
+            linked = False
+
+        if not linked:
+            GL.glDeleteProgram(program)
+            self._reject(cache_path)
+            return None
+
+        return program
+
+    def _store_binary(self, program: int, cache_path: str) -> None:
+        length = GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH)
+        if length < 1:
+            return
+
+        binary = (ctypes.c_ubyte * length)()
+        written = GL.GLsizei(0)
+        binary_format = GL.GLenum(0)
+        GL.glGetProgramBinary(
+            program, length, ctypes.byref(written), ctypes.byref(binary_format), binary
+        )
+
+        # Write to a temporary file first, so that concurrent startups never read partial binaries.
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(_HEADER.pack(binary_format.value))
+                cache_file.write(bytes(binary)[: written.value])
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            print(f"Failed to cache shader program: {e}")
+
+    def _reject(self, cache_path: str) -> None:
+        self.rejected += 1
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+
+    def __repr__(self) -> str:
+        return (
+            f"ProgramRegistry(compiled: {self.compiled}, loaded: {self.loaded}, "
+            f"rejected: {self.rejected})"
+        )
@@ -0,0 +1,313 @@
+import collections, math
+import numpy
+
+from PIL import Image, ImageDraw, ImageFont
+from OpenGL import GL
+
+from typing import Dict, List, Optional, Tuple
+
+from . import formations, gpu_resources
+
+# Pillow puts this many pixels between lines of multi-line text; glyph layout does the same.
+LINE_SPACING = 4
+
+# Glyph quad in layout coordinates (x, y of the bottom left corner, width, height) and its UV.
+GlyphQuad = Tuple[float, float, float, float, formations.UvRect]
+
+
+class Font:
+    """
+    A font loaded at one size. Extents of measured strings are remembered, the least recently
+    measured ones are forgotten once there are more than `capacity` of them.
+    """
+
+    CAPACITY = 256
+
+    def __init__(self, name: str, size: int, capacity: int = CAPACITY) -> None:
+        self.image_font = ImageFont.truetype(name, size)
+        self.ascent, self.descent = self.image_font.getmetrics()
+        self._capacity = capacity
+        self._extents: "collections.OrderedDict[str, Tuple[int, int]]" = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_line_height(self) -> int:
+        return self.ascent + self.descent
+
+    def get_size(self, text: str) -> Tuple[int, int]:
+        """Returns the width and height of the text as PIL would draw it."""
+
+        extents = self._extents.get(text)
+        if extents is not None:
+            self.hits += 1
+            self._extents.move_to_end(text)
+            return extents
+
+        self.misses += 1
+        extents = self._extents[text] = self.image_font.getsize(text)
+        if len(self._extents) > self._capacity:
+            self._extents.popitem(last=False)
+        return extents
+
+    def __repr__(self) -> str:
+        return f"Font(extents: {len(self._extents)}, hits: {self.hits}, misses: {self.misses})"
+
+
+class FontRegistry:
+    """Fonts of all names and sizes in use, each loaded when first needed."""
+
+    def __init__(self) -> None:
+        self._fonts: Dict[Tuple[str, int], Font] = dict()
+
+    def get_font(self, name: str, size: int) -> Font:
+        font = self._fonts.get((name, size))
+        if font is None:
+            font = self._fonts[(name, size)] = Font(name, size)
+        return font
+
+    def __repr__(self) -> str:
+        return f"FontRegistry(fonts: {len(self._fonts)})"
+
+
+# Fonts are shared by the whole process, so that every font file is parsed once per size.
+FONTS = FontRegistry()
+
+
+class Glyph:
+    """
+    Placement of a glyph in the atlas. Sizes are in pixels of the atlas base size; `left` and `top`
+    give the corner of the glyph image relative to the pen position on the baseline.
+    """
+
+    def __init__(
+        self,
+        advance: float,
+        left: float = 0.0,
+        top: float = 0.0,
+        width: int = 0,
+        height: int = 0,
+        uv: formations.UvRect = formations.FULL_UV,
+    ) -> None:
+        self.advance = advance
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.uv = uv
+
+    def is_blank(self) -> bool:
+        return self.width == 0 or self.height == 0
+
+    def __repr__(self) -> str:
+        return f"Glyph(advance: {self.advance}, size: {self.width}x{self.height})"
+
+
+class GlyphAtlas:
+    """
+    Glyphs of one font stored as signed distance fields in a single-channel texture.
+
+    Glyphs are rasterized once at `base_size` and drawn at any size by scaling their quads; the
+    fragment shader turns distances into sharp edges. Printable ASCII is prepared up front, other
+    characters are added, and uploaded as a sub-image, when first used. Characters which do not fit
+    anymore are drawn as blanks.
+    """
+
+    BASE_SIZE = 48
+    SPREAD = 6
+    ATLAS_SIZE = 1024
+    PRELOADED = "".join(chr(code) for code in range(32, 127))
+
+    def __init__(
+        self,
+        font_name: str,
+        base_size: int = BASE_SIZE,
+        spread: int = SPREAD,
+        atlas_size: int = ATLAS_SIZE,
+    ) -> None:
+        self._font = ImageFont.truetype(font_name, base_size)
+        self._base_size = base_size
+        self._spread = spread
+        self._atlas_size = atlas_size
+        self._ascent, self._descent = self._font.getmetrics()
+        self._glyphs: Dict[str, Glyph] = dict()
+
+        # Glyphs are packed in shelves: rows filled from left to right.
+        self._shelf_x = 0
+        self._shelf_y = 0
+        self._shelf_height = 0
+
+        self.uploads = 0
+
+        self._texture_id = GL.glGenTextures(1)
+        gpu_resources.RESOURCES.track(gpu_resources.TEXTURE, self._texture_id, "glyphs")
+        gpu_resources.RESOURCES.set_texture_size(self._texture_id, atlas_size, atlas_size, 1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        empty = numpy.zeros((atlas_size, atlas_size), dtype=numpy.uint8)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(
+            GL.GL_TEXTURE_2D,
+            0,
+            GL.GL_R8,
+            atlas_size,
+            atlas_size,
+            0,
+            GL.GL_RED,
+            GL.GL_UNSIGNED_BYTE,
+            empty,
+        )
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+        for char in self.PRELOADED:
+            self.get_glyph(char)
+
+    def get_texture_id(self) -> int:
+        return self._texture_id
+
+    def get_line_height(self, font_size: float) -> float:
+        return (self._ascent + self._descent) * font_size / self._base_size
+
+    def get_glyph(self, char: str) -> Glyph:
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            glyph = self._glyphs[char] = self._add_glyph(char)
+        return glyph
+
+    def measure(self, text: str, font_size: float) -> float:
+        """Returns the width of the widest line of the text."""
+
+        scale = font_size / self._base_size
+        return scale * max(
+            sum(self.get_glyph(char).advance for char in line) for line in text.split("\n")
+        )
+
+    def layout(self, text: str, font_size: float, x: float, top: float) -> List[GlyphQuad]:
+        """
+        Places glyphs of the text with the first line starting at `x` and the top of its ascender
+        at `top`. Coordinates grow up and right, as in formations.
+        """
+
+        scale = font_size / self._base_size
+        line_step = self.get_line_height(font_size) + LINE_SPACING
+        baseline = top - scale * self._ascent
+
+        quads: List[GlyphQuad] = list()
+        for line in text.split("\n"):
+            pen = x
+            for char in line:
+                glyph = self.get_glyph(char)
+                if not glyph.is_blank():
+                    left = pen + scale * glyph.left
+                    bottom = baseline + scale * (glyph.top - glyph.height)
+                    width, height = scale * glyph.width, scale * glyph.height
+                    quads.append((left, bottom, width, height, glyph.uv))
+                pen += scale * glyph.advance
+            baseline -= line_step
+
+        return quads
+
+    def delete(self) -> None:
+        gpu_resources.RESOURCES.forget(gpu_resources.TEXTURE, self._texture_id)
+        GL.glDeleteTextures([self._texture_id])
+
+    def _add_glyph(self, char: str) -> Glyph:
+        advance = self._font.getlength(char)
+        x1, y1, x2, y2 = self._font.getbbox(char, anchor="ls")
+        if x2 <= x1 or y2 <= y1:
+            return Glyph(advance)
+
+        spread = self._spread
+        width, height = x2 - x1 + 2 * spread, y2 - y1 + 2 * spread
+        position = self._allocate(width, height)
+        if position is None:
+            print(f"Glyph atlas is full, '{char}' will not be drawn")
+            return Glyph(advance)
+
+        image = Image.new("L", (width, height), 0)
+        draw = ImageDraw.Draw(image)
+        draw.text((spread - x1, spread - y1), char, fill=255, font=self._font, anchor="ls")
+        field = make_distance_field(numpy.asarray(image) >= 128, spread)
+
+        x, y = position
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_id)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexSubImage2D(
+            GL.GL_TEXTURE_2D, 0, x, y, width, height, GL.GL_RED, GL.GL_UNSIGNED_BYTE, field
+        )
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self.uploads += 1
+
+        size = self._atlas_size
+        uv = (x / size, y / size, (x + width) / size, (y + height) / size)
+        return Glyph(advance, x1 - spread, spread - y1, width, height, uv)
+
+    def _allocate(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        # One pixel of space between glyphs keeps linear filtering from mixing neighbours.
+        if self._shelf_x + width + 1 > self._atlas_size:
+            self._shelf_x = 0
+            self._shelf_y += self._shelf_height + 1
+            self._shelf_height = 0
+
+        if self._shelf_y + height + 1 > self._atlas_size or width + 1 > self._atlas_size:
+            return None
+
+        position = (self._shelf_x, self._shelf_y)
+        self._shelf_x += width + 1
+        self._shelf_height = max(self._shelf_height, height)
+        return position
+
+    def __repr__(self) -> str:
+        return f"GlyphAtlas(glyphs: {len(self._glyphs)}, uploads: {self.uploads})"
+
+
+class TextEngine:
+    """Glyph atlases of all fonts in use, created when a font is first needed."""
+
+    def __init__(self) -> None:
+        self._atlases: Dict[str, GlyphAtlas] = dict()
+
+    def get_atlas(self, font_name: str) -> GlyphAtlas:
+        atlas = self._atlases.get(font_name)
+        if atlas is None:
+            atlas = self._atlases[font_name] = GlyphAtlas(font_name)
+        return atlas
+
+    def delete(self) -> None:
+        for atlas in self._atlases.values():
+            atlas.delete()
+        self._atlases.clear()
+
+    def __repr__(self) -> str:
+        return f"TextEngine(fonts: {', '.join(self._atlases.keys())})"
+
+
+def make_distance_field(inside: numpy.ndarray, spread: int) -> numpy.ndarray:
+    """
+    Converts a mask to a signed distance field: 128 on the outline, growing inwards, reaching 0 and
+    255 at `spread` pixels from it. Distances are searched within `spread` by shifting the whole
+    mask, which is cheap for glyph-sized images.
+    """
+
+    height, width = inside.shape
+    padded = numpy.pad(inside, spread)
+    to_outside = numpy.full(inside.shape, spread + 1.0, dtype=numpy.float32)
+    to_inside = numpy.full(inside.shape, spread + 1.0, dtype=numpy.float32)
+
+    for dy in range(-spread, spread + 1):
+        for dx in range(-spread, spread + 1):
+            distance = math.hypot(dx, dy)
+            if distance > spread or distance == 0.0:
+                continue
+            shifted = padded[spread + dy : spread + dy + height, spread + dx : spread + dx + width]
+            numpy.minimum(to_outside, numpy.where(shifted, spread + 1.0, distance), out=to_outside)
+            numpy.minimum(to_inside, numpy.where(shifted, distance, spread + 1.0), out=to_inside)
+
+    # The outline runs between pixel centers, half a pixel from the closest opposite pixel.
+    signed = numpy.where(inside, to_outside - 0.5, 0.5 - to_inside)
+    return numpy.clip(128.0 + 127.0 * signed / spread, 0.0, 255.0).astype(numpy.uint8)
@@ -1,21 +1,26 @@
 import time, threading
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import edgin_around_rendering as ear
 from edgin_around_api import defs
-from . import thrusting, motives, gui, media
+from . import assets, thrusting, motives, gui, media
 
 
 class Thruster:
     def __init__(
-        self, _scene: ear.Scene, _world: ear.WorldExpositor, _gui: gui.Gui, resource_dir: str
+        self,
+        _scene: ear.Scene,
+        _world: ear.WorldExpositor,
+        _gui: gui.Gui,
+        resource_dir: str,
+        loader: Optional[assets.AssetLoader] = None,
     ) -> None:
         self.context = thrusting.MotiveContext(
             scene=_scene,
             world=_world,
             gui=_gui,
-            sounds=media.Sounds(resource_dir),
+            sounds=media.Sounds(resource_dir, loader),
         )
 
         self.general_motives: List[motives.Motive] = list()
@@ -40,6 +45,20 @@ class Thruster:
 
         self.prev_tick = now
 
+    def is_active(self) -> bool:
+        """Tells if there are motives which did not expire yet."""
+
+        with self.mutex:
+            return any(not m.expired() for m in self.general_motives) or any(
+                not m.expired() for m in self.actor_motives.values()
+            )
+
+    def describe_motives(self) -> List[str]:
+        with self.mutex:
+            return [repr(m) for m in self.general_motives] + [
+                repr(m) for m in self.actor_motives.values()
+            ]
+
     def add(self, motive: motives.Motive) -> None:
         actor_id = motive.get_actor_id()
         with self.mutex:
@@ -1,6 +1,8 @@
-import pyglet
+import pyglet, time
 
-from . import thruster, controls, gui
+from typing import Optional, Tuple
+
+from . import thruster, controls, gui, pacing, profiling
 
 
 class Window(pyglet.window.Window):
@@ -11,27 +13,41 @@ class Window(pyglet.window.Window):
         gui: gui.Gui,
         controls: controls.Controls,
         thruster: thruster.Thruster,
+        pacer: pacing.FramePacer,
+        profiler: profiling.Profiler,
+        vsync: bool = True,
+        size: Optional[Tuple[int, int]] = None,
     ) -> None:
-        super().__init__(resizable=True)
-        self.maximize()
+        if size is not None:
+            super().__init__(*size, resizable=True, vsync=vsync)
+        else:
+            super().__init__(resizable=True, vsync=vsync)
+            self.maximize()
 
         self._gui = gui
         self._controls = controls
         self._thruster = thruster
+        self._pacer = pacer
+        self._profiler = profiler
+        self._prev_frame: Optional[float] = None
 
     def run(self) -> None:
         pyglet.app.run()
 
     def on_key_press(self, symbol, modifiers) -> None:
+        self._pacer.wake()
         self._controls.handle_key_press(symbol, modifiers)
 
     def on_key_release(self, symbol, modifiers) -> None:
+        self._pacer.wake()
         self._controls.handle_key_release(symbol, modifiers)
 
     def on_mouse_press(self, x, y, button, modifiers) -> None:
+        self._pacer.wake()
         self._gui.handle_button_press(x, y, button, modifiers)
 
     def on_mouse_release(self, x, y, button, modifiers) -> None:
+        self._pacer.wake()
         self._gui.handle_button_release(x, y, button, modifiers)
 
     def on_mouse_motion(self, x, y, dx, dy) -> None:
@@ -39,14 +55,29 @@ class Window(pyglet.window.Window):
 
     def on_resize(self, width, height) -> None:
         super().on_resize(width, height)
+        self._pacer.wake()
         self._gui.handle_resize(width, height)
 
     def on_draw(self) -> None:
-        self._controls.handle_draw()
-        self._thruster.thrust()
-        self._gui.draw()
-        self._schedule_redraw()
-
-    def _schedule_redraw(self) -> None:
-        noop = lambda *args, **kwargs: None
-        pyglet.clock.schedule_once(noop, 0.0)
+        # Only intervals between frames rendered at the full rate tell how expensive frames are.
+        now = time.monotonic()
+        if self._prev_frame is not None:
+            self._gui.handle_frame_time(now - self._prev_frame)
+        self._prev_frame = now if not self._pacer.is_idle() else None
+
+        profiler = self._profiler
+        profiler.begin_frame()
+
+        with profiler.phase("controls"):
+            self._controls.handle_draw()
+        with profiler.phase("thrust"):
+            self._thruster.thrust()
+        if profiler.is_capturing():
+            profiler.annotate("motives", self._thruster.describe_motives())
+
+        busy = self._controls.is_active() or self._thruster.is_active() or self._gui.is_dirty()
+        with profiler.phase("gui"):
+            self._gui.draw()
+
+        profiler.end_frame()
+        self._pacer.handle_frame(busy)
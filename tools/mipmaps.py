@@ -0,0 +1,23 @@
+"""
+Generates mipmap levels of images ahead of time and stores them next to the images, like
+`map.mip3.png`, so that they are not computed when the images are loaded. Levels older than their
+image are ignored by the game.
+"""
+
+import argparse
+
+from src import mipmaps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="+", metavar="IMAGE", help="Images to generate levels of")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        for level_path in mipmaps.generate_level_files(path):
+            print(level_path)
+
+
+if __name__ == "__main__":
+    main()